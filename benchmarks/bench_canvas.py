@@ -0,0 +1,64 @@
+from flipper_playground import Align, Canvas, CanvasTemplate, Slot
+
+
+def draw_chart(canvas: Canvas, primitives: int):
+    # a mix of the primitives a chart callback uses: dots, lines, frames and labels
+    for i in range(primitives):
+        kind = i % 4
+        x, y = i % 128, (i * 7) % 64
+        if kind == 0:
+            canvas.draw_dot(x, y)
+        elif kind == 1:
+            canvas.draw_line(x, y, (x + 10) % 128, (y + 5) % 64)
+        elif kind == 2:
+            canvas.draw_rframe(x % 100, y % 40, 20, 20, 3)
+        else:
+            canvas.draw_str_align(x, y, Align.Center, Align.Center, "label")
+
+
+def bench_build(primitives: int):
+    def factory():
+        def run():
+            canvas = Canvas()
+            draw_chart(canvas, primitives)
+            return canvas.compile_draw_data()
+        return run
+    return factory
+
+
+def bench_compile(primitives: int):
+    def factory():
+        canvas = Canvas()
+        draw_chart(canvas, primitives)
+        return canvas.compile_draw_data
+    return factory
+
+
+def bench_template(primitives: int):
+    def factory():
+        template = CanvasTemplate()
+        draw_chart(template, primitives)
+        template.draw_str_align(64, 32, Align.Center, Align.Center, Slot("value"))
+        return lambda: template.render(value="42").compile_draw_data()
+    return factory
+
+
+def bench_rasterize(primitives: int):
+    def factory():
+        from flipper_playground import CanvasRasterizer
+
+        canvas = Canvas()
+        draw_chart(canvas, primitives)
+        draw_data = bytes(canvas.compile_draw_data())
+        rasterizer = CanvasRasterizer()
+        rasterizer.render(draw_data)
+        return lambda: rasterizer.render(draw_data)
+    return factory
+
+
+BENCHMARKS = {}
+for primitives in (10, 100, 1000):
+    BENCHMARKS[f"build_{primitives}"] = bench_build(primitives)
+    BENCHMARKS[f"compile_{primitives}"] = bench_compile(primitives)
+    BENCHMARKS[f"template_{primitives}"] = bench_template(primitives)
+    BENCHMARKS[f"rasterize_{primitives}"] = bench_rasterize(primitives)
@@ -0,0 +1,82 @@
+from flipper_playground import Flipper, InputKey, InputType, MemoryTransport, ProtoID
+from flipper_playground.protocol.proto_utils import payload_e
+
+FRAMES = 1000
+
+
+def make_flipper(threaded_reader: bool = False) -> tuple[Flipper, MemoryTransport]:
+    host, device = MemoryTransport.pair(timeout=0.1)
+    flipper = Flipper(threaded_reader=threaded_reader)
+    flipper.open_transport(host)
+
+    count = [0]
+
+    @flipper.input_event()
+    def input_event(data):
+        count[0] += 1
+
+    return flipper, device
+
+
+def input_stream(frames: int) -> bytes:
+    keys, types = list(InputKey)[:-1], list(InputType)[:-1]
+    return b"".join(
+        payload_e(ProtoID.INPUT_ID, bytes([keys[i % len(keys)], types[i % len(types)]]))
+        for i in range(frames)
+    )
+
+
+def bench_parse_bytes():
+    flipper, _ = make_flipper()
+    return lambda: flipper.parse_bytes(ProtoID.INPUT_ID, b"\x01\x02")
+
+
+def bench_handle_event():
+    flipper, _ = make_flipper()
+    data = flipper.parse_bytes(ProtoID.INPUT_ID, b"\x01\x02")
+    return lambda: flipper.handle_event(ProtoID.INPUT_ID, data)
+
+
+def bench_dispatch_table():
+    flipper, _ = make_flipper()
+    entry = flipper.compile_dispatch_table()[ProtoID.INPUT_ID]
+    return lambda: entry(b"\x01\x02")
+
+
+def bench_receive_1000():
+    # receive + parse_bytes + handle_event for a burst of input frames, one frame at a time
+    flipper, device = make_flipper()
+    stream = input_stream(FRAMES)
+
+    def run():
+        device.write(stream)
+        for _ in range(FRAMES):
+            id, data = flipper.receive()
+            flipper.handle_event(id, data)
+    return run
+
+
+def bench_event_loop_batch_1000():
+    # the event loop's path: raw frames drained in batches through the compiled dispatch table
+    flipper, device = make_flipper()
+    stream = input_stream(FRAMES)
+
+    def run():
+        device.write(stream)
+        received = 0
+        while received < FRAMES:
+            flipper._frame_buffer.rewind()
+            id, data = flipper.receive_raw()
+            events = flipper._receive_batch(id, data)
+            flipper._dispatch_events(events)
+            received += len(events)
+    return run
+
+
+BENCHMARKS = {
+    "parse_bytes": bench_parse_bytes,
+    "handle_event": bench_handle_event,
+    "dispatch_table": bench_dispatch_table,
+    "receive_1000": bench_receive_1000,
+    "event_loop_batch_1000": bench_event_loop_batch_1000,
+}
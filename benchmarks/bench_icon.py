@@ -0,0 +1,27 @@
+from pathlib import Path
+
+from flipper_playground.protocol.icon import file2icon
+from flipper_playground.protocol.icon_cache import IconCache
+
+ASSETS = Path(__file__).resolve().parent.parent / "examples" / "rps" / "assets"
+
+
+def bench_file2icon(path: Path):
+    return lambda: lambda: file2icon(path)
+
+
+def bench_cache_hit():
+    # warmed up below, so every get is an in-memory hit and nothing is written to disk
+    cache = IconCache(persistent=False)
+    paths = sorted(ASSETS.glob("*.png"))
+    for path in paths:
+        cache.get(path)
+
+    def run():
+        for path in paths:
+            cache.get(path)
+    return run
+
+
+BENCHMARKS = {f"file2icon_{path.stem}": bench_file2icon(path) for path in sorted(ASSETS.glob("*.png"))}
+BENCHMARKS["cache_hit_all"] = bench_cache_hit
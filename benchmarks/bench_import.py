@@ -0,0 +1,62 @@
+import argparse
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# the imports of a text only app like examples/counter.py
+COUNTER_IMPORT = "from flipper_playground import Flipper, Canvas, Align, InputData, InputKey, InputType, Font"
+
+# only loaded on first use of the icon pipeline or the async event loop
+LAZY_MODULES = ("PIL", "heatshrink2", "numpy", "asyncio")
+
+
+def import_time_us(statement: str = COUNTER_IMPORT) -> int:
+    # cumulative import time of the package as reported by -X importtime, in a fresh interpreter
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    times = re.findall(r"^import time:\s+\d+ \|\s+(\d+) \| flipper_playground$", result.stderr, re.MULTILINE)
+    return int(times[-1])
+
+
+def loaded_lazy_modules(statement: str = COUNTER_IMPORT) -> list[str]:
+    check = f"{statement}\nimport sys\nprint(' '.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", check], cwd=ROOT, capture_output=True, text=True, check=True)
+    return result.stdout.split()
+
+
+def bench_cold_import():
+    return lambda: subprocess.run([sys.executable, "-c", COUNTER_IMPORT], cwd=ROOT, check=True)
+
+
+BENCHMARKS = {
+    "cold_import": bench_cold_import,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="check the import time budget of a text only app")
+    parser.add_argument("--budget-ms", type=float, default=100)
+    parser.add_argument("-n", "--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    failed = False
+    loaded = loaded_lazy_modules()
+    if loaded:
+        print(f"eagerly imported: {', '.join(loaded)}")
+        failed = True
+
+    best_ms = min(import_time_us() for _ in range(args.runs)) / 1000
+    print(f"import flipper_playground: {best_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    if best_ms > args.budget_ms:
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
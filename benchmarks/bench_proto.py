@@ -0,0 +1,31 @@
+from flipper_playground.protocol.proto_utils import ProtoID, int8_e, int16_e, int32_e, payload_e, str_e
+
+
+def bench_int8_e():
+    return lambda: int8_e(200)
+
+
+def bench_int16_e():
+    return lambda: int16_e(60000)
+
+
+def bench_int32_e():
+    return lambda: int32_e(4000000000)
+
+
+def bench_str_e():
+    return lambda: str_e("Bennnn Counter")
+
+
+def bench_payload_e():
+    data = int8_e(1) + int8_e(2) + int8_e(3) + int8_e(4)
+    return lambda: payload_e(ProtoID.GUI_DRAW_FRAME_ID, data)
+
+
+BENCHMARKS = {
+    "int8_e": bench_int8_e,
+    "int16_e": bench_int16_e,
+    "int32_e": bench_int32_e,
+    "str_e": bench_str_e,
+    "payload_e": bench_payload_e,
+}
@@ -0,0 +1,89 @@
+import argparse
+import importlib
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import timeit
+from pathlib import Path
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARK_DIR.parent))
+sys.path.insert(0, str(BENCHMARK_DIR))
+
+MODULES = ["bench_proto", "bench_canvas", "bench_icon", "bench_dispatch", "bench_import"]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BENCHMARK_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def collect(selected: list[str]) -> dict[str, callable]:
+    benchmarks = {}
+    for module_name in MODULES:
+        module = importlib.import_module(module_name)
+        for name, factory in module.BENCHMARKS.items():
+            full_name = f"{module_name.removeprefix('bench_')}.{name}"
+            if not selected or any(pattern in full_name for pattern in selected):
+                benchmarks[full_name] = factory
+    return benchmarks
+
+
+def measure(factory: callable, repeat: int) -> dict:
+    func = factory()
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    times = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "number": number,
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "stdev_s": statistics.stdev(times) if len(times) > 1 else 0.0,
+    }
+
+
+def compare(results: dict, baseline_path: str):
+    baseline = json.loads(Path(baseline_path).read_text())["benchmarks"]
+    print(f"\ncompared to {baseline_path}:")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["min_s"] / baseline[name]["min_s"]
+        print(f"  {name:<45} {ratio:6.2f}x {'slower' if ratio > 1 else 'faster'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="flipper_playground benchmarks")
+    parser.add_argument("filters", nargs="*", help="only run benchmarks whose name contains one of these")
+    parser.add_argument("-o", "--output", help="write results as JSON to this file")
+    parser.add_argument("-c", "--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = {}
+    for name, factory in collect(args.filters).items():
+        result = measure(factory, args.repeat)
+        results[name] = result
+        print(f"{name:<45} {result['min_s'] * 1e6:12.2f} us  (median {result['median_s'] * 1e6:.2f} us)")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "benchmarks": results,
+        }, indent=2))
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-import time
+import logging
 import random
 
 from flipper_playground import Flipper, InputData, InputKey, InputType, Light, Canvas, Align
@@ -9,7 +9,10 @@ key_name = '?'
 key_type_name = '?'
 
 
+logging.basicConfig(level=logging.INFO)
+
 flipper = Flipper()
+flipper.enable_stats(dump_interval=10)
 
 
 @flipper.start_event()
@@ -27,8 +30,6 @@ def disconnected_callback():
 def input_callback(data: InputData):
     global sound, key_name, key_type_name
 
-    start = time.perf_counter_ns()
-
     if data.key == InputKey.Ok and data.key_type == InputType.Short:
         if sound:
             flipper.send_speaker_stop()
@@ -47,8 +48,6 @@ def input_callback(data: InputData):
     key_type_name = data.key_type.name
     flipper.update_view()
 
-    print(f"input_callback: {(time.perf_counter_ns() - start) / 1000000} ms")
-
 
 @flipper.draw_callback()
 def draw_callback(canvas: Canvas):
@@ -1,7 +1,7 @@
 from enum import IntEnum
 from random import randint
 
-from flipper_playground import Flipper, Canvas, InputData, InputKey, InputType
+from flipper_playground import Flipper, Canvas, CanvasTemplate, InputData, InputKey, InputType, Slot
 
 
 class RPSIcons(IntEnum):
@@ -67,10 +67,12 @@ flipper = Flipper()
 @flipper.start_event()
 def start_event():
     print("connected_callback")
-    flipper.send_icon_add(RPSIcons.Rock, "assets/rock.png")
-    flipper.send_icon_add(RPSIcons.Paper, "assets/paper.png")
-    flipper.send_icon_add(RPSIcons.Scissor, "assets/scissor.png")
-    flipper.send_icon_add(RPSIcons.Empty, "assets/empty.png")
+    flipper.send_icons_add({
+        RPSIcons.Rock: "assets/rock.png",
+        RPSIcons.Paper: "assets/paper.png",
+        RPSIcons.Scissor: "assets/scissor.png",
+        RPSIcons.Empty: "assets/empty.png",
+    })
     flipper.update_view()
 
 
@@ -101,19 +103,28 @@ def input_event(event: InputData):
     flipper.update_view()
 
 
-@flipper.draw_callback()
-def draw_callback(canvas: Canvas):
-    canvas.draw_str_align_center(24, 12, "Bot")
-    canvas.draw_str_align_center(104, 12, "You")
+layout = CanvasTemplate()
+layout.draw_str_align_center(24, 12, "Bot")
+layout.draw_str_align_center(104, 12, "You")
+
+layout.draw_str_align_center(64, 12, Slot("score"))
+layout.draw_str_align_center(64, 32, "<- VS ->")
 
-    canvas.draw_str_align_center(64, 12, f'[{rps.opponent_score} | {rps.player_score}]')
-    canvas.draw_str_align_center(64, 32, "<- VS ->")
+layout.draw_rframe(10, 18, 28, 28, 8)
+layout.draw_icon(14, 22, Slot("opponent"))
 
-    canvas.draw_rframe(10, 18, 28, 28, 8)
-    canvas.draw_icon(14, 22, rps.opponent)
+layout.draw_rframe(90, 18, 28, 28, 8)
+layout.draw_icon(94, 22, Slot("player"))
 
-    canvas.draw_rframe(90, 18, 28, 28, 8)
-    canvas.draw_icon(94, 22, rps.player)
+
+@flipper.draw_callback()
+def draw_callback(canvas: Canvas):
+    layout.render_into(
+        canvas,
+        score=f'[{rps.opponent_score} | {rps.player_score}]',
+        opponent=rps.opponent,
+        player=rps.player,
+    )
 
 
 flipper.open_serial()
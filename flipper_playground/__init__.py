@@ -1,2 +1,24 @@
+from . import flipper, protocol
 from .flipper import *
 from .protocol import *
+
+_LAZY_ATTRS = {
+    **dict.fromkeys(flipper._LAZY_ATTRS, flipper),
+    **dict.fromkeys(protocol._LAZY_ATTRS, protocol),
+}
+
+# a star import of the package still gets every name, only explicit imports stay lazy
+__all__ = [name for name in globals() if not name.startswith("_")] + list(_LAZY_ATTRS)
+
+
+def __getattr__(name: str):
+    package = _LAZY_ATTRS.get(name)
+    if package is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(package, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(_LAZY_ATTRS))
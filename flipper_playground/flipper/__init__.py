@@ -2,3 +2,32 @@ from .base import *
 from .draw import *
 from .hardware import *
 from .input import *
+from .template import *
+from .transport import *
+from .simulator import *
+from .stats import *
+from .sequencer import *
+from .capture import *
+from .connection import *
+from .pool import *
+
+# asyncio and numpy are only imported by apps that use the async event loop or the rasterizer
+_LAZY_ATTRS = {
+    **dict.fromkeys(("AsyncFlipper", "AsyncSerialTransport"), ".aio"),
+    **dict.fromkeys(("CanvasRasterizer", "SCREEN_WIDTH", "SCREEN_HEIGHT"), ".raster"),
+}
+
+
+def __getattr__(name: str):
+    module = _LAZY_ATTRS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    from importlib import import_module
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(_LAZY_ATTRS))
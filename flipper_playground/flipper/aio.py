@@ -0,0 +1,263 @@
+import asyncio
+import inspect
+import logging
+import os
+from collections import deque
+
+from serial import Serial
+
+from .base import Flipper
+from .capture import Direction
+from ..protocol.framer import ProtoFramer
+from ..protocol.protocols import ProtoID
+
+
+class AsyncSerialTransport:
+    def __init__(self, serial: Serial, chunk_size: int = 4096) -> None:
+        self.serial = serial
+        self.chunk_size = chunk_size
+        self.fd = serial.fileno()
+        self.loop = asyncio.get_running_loop()
+        self.error: Exception = None
+        self._rx = bytearray()
+        self._tx = bytearray()
+        self._rx_waiter: asyncio.Future = None
+        self._drain_waiter: asyncio.Future = None
+
+        os.set_blocking(self.fd, False)
+        self.loop.add_reader(self.fd, self._on_readable)
+
+    def _on_readable(self):
+        try:
+            data = os.read(self.fd, self.chunk_size)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self._set_error(e)
+            return
+
+        if not data:
+            self._set_error(ConnectionError("serial port closed"))
+            return
+
+        self._rx.extend(data)
+        self._wake(self._rx_waiter)
+
+    def _on_writable(self):
+        try:
+            written = os.write(self.fd, self._tx)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self._set_error(e)
+            return
+
+        del self._tx[:written]
+        if not self._tx:
+            self.loop.remove_writer(self.fd)
+            self._wake(self._drain_waiter)
+
+    def _set_error(self, error: Exception):
+        self.error = error
+        self.loop.remove_reader(self.fd)
+        self.loop.remove_writer(self.fd)
+        self._wake(self._rx_waiter)
+        self._wake(self._drain_waiter)
+
+    @staticmethod
+    def _wake(waiter: asyncio.Future):
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def _wait_rx(self):
+        if self.error is not None:
+            raise self.error
+        self._rx_waiter = self.loop.create_future()
+        try:
+            await self._rx_waiter
+        finally:
+            self._rx_waiter = None
+        if self.error is not None and not self._rx:
+            raise self.error
+
+    async def read(self) -> bytes:
+        while not self._rx:
+            await self._wait_rx()
+        data = bytes(self._rx)
+        self._rx.clear()
+        return data
+
+    async def read_until(self, terminator: bytes) -> bytes:
+        while (index := self._rx.find(terminator)) < 0:
+            await self._wait_rx()
+        end = index + len(terminator)
+        data = bytes(self._rx[:end])
+        del self._rx[:end]
+        return data
+
+    @property
+    def idle(self) -> bool:
+        return not self._rx and not self._tx
+
+    def write(self, data: bytes):
+        if self.error is not None:
+            raise self.error
+
+        if not self._tx:
+            try:
+                written = os.write(self.fd, data)
+            except BlockingIOError:
+                written = 0
+            data = data[written:]
+            if not data:
+                return
+            self.loop.add_writer(self.fd, self._on_writable)
+        self._tx.extend(data)
+
+    async def drain(self):
+        while self._tx:
+            if self.error is not None:
+                raise self.error
+            self._drain_waiter = self.loop.create_future()
+            try:
+                await self._drain_waiter
+            finally:
+                self._drain_waiter = None
+
+    def close(self):
+        self.loop.remove_reader(self.fd)
+        self.loop.remove_writer(self.fd)
+        self.serial.close()
+
+
+class AsyncFlipper(Flipper):
+    def __init__(self, log_level: int = None, max_batch: int = 64):
+        self.transport: AsyncSerialTransport = None
+        self.framer: ProtoFramer = ProtoFramer()
+        self._flush_handle: asyncio.TimerHandle = None
+        self._pending_frames: deque = deque()
+        super().__init__(log_level=log_level, max_batch=max_batch)
+
+    def _write_serial(self, payload: bytes):
+        self.transport.write(payload)
+
+    async def drain(self):
+        await self.transport.drain()
+
+    def link_idle(self) -> bool:
+        return not self._pending_frames and self.transport.idle
+
+    def flush_view(self, force: bool = False):
+        super().flush_view(force)
+        # nothing wakes the loop up for a deferred frame, so schedule the flush
+        timeout = self.view_flush_timeout()
+        if timeout is not None and self._flush_handle is None:
+            self._flush_handle = self.transport.loop.call_later(timeout, self._scheduled_flush)
+
+    def _scheduled_flush(self):
+        self._flush_handle = None
+        if self.running:
+            with self.batch():
+                self.flush_view(force=True)
+
+    async def frames(self):
+        pending = self._pending_frames
+        while self.running:
+            if not pending:
+                pending.extend(self.framer.feed(await self.transport.read()))
+                continue
+            id, raw = pending.popleft()
+            if self.recorder is not None:
+                self.recorder.record(Direction.Received, id, raw)
+            yield id, (None if raw is None else self.parse_bytes(id, raw))
+
+    async def receive(self) -> (ProtoID, bytes):
+        async for id, data in self.frames():
+            return id, data
+        return None, None
+
+    async def handle_event(self, id: ProtoID, data: object=None):
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Handling event: %s", id)
+        if id in self.event_handlers:
+            for handler in self.event_handlers[id]:
+                result = handler() if data is None else handler(data)
+                if inspect.isawaitable(result):
+                    await result
+        else:
+            self.logger.debug("No event handler for proto id: %s", id)
+
+    async def handle_events(self, events: list[tuple[ProtoID, object]]):
+        batches: dict[ProtoID, list] = {}
+        for id, data in events:
+            if id in self.event_handlers or id not in self.batch_event_handlers:
+                await self.handle_event(id, data)
+            if id in self.batch_event_handlers:
+                batches.setdefault(id, []).append(data)
+
+        for id, batch in batches.items():
+            for handler, coalesce in self.batch_event_handlers[id]:
+                result = handler(coalesce(batch) if coalesce else batch)
+                if inspect.isawaitable(result):
+                    await result
+
+    async def event_loop(self):
+        if self.running:
+            # error
+            return
+
+        # start running
+        self.running = True
+        self.reset_view()
+        self.reset_hardware_state()
+        self.transport = AsyncSerialTransport(self.serial)
+        self.framer.reset()
+        self._pending_frames.clear()
+
+        try:
+            # ask for a fresh prompt, the banner may have been printed before the port was opened
+            self.transport.write(b"\r\n")
+            await self.transport.read_until(b">: ")
+
+            # run the python playground command
+            self.logger.info("starting...")
+            self.transport.write(b"python_playground\r\n")
+            await self.transport.read_until(b"python_playground\r\n")
+
+            frames = self.frames()
+            id, data = await anext(frames, (None, None))
+            if id != ProtoID.CNT_FLIPPER_START_ID:
+                self.logger.error("failed to start")
+                return
+
+            # Wait for flipper to enter the main loop
+            await asyncio.sleep(self.start_delay)
+            with self.batch():
+                await self.handle_event(id, data)
+
+            self.logger.info("started!")
+
+            async for id, data in frames:
+                # frames that are already framed are handled and drawn together
+                events = [(id, data)]
+                while self._pending_frames and len(events) < self.max_batch and id != ProtoID.CNT_FLIPPER_STOP_ID:
+                    id, data = await anext(frames)
+                    events.append((id, data))
+
+                with self.batch():
+                    with self.defer_view():
+                        await self.handle_events(events)
+                    self.flush_view()
+                if events[-1][0] == ProtoID.CNT_FLIPPER_STOP_ID:
+                    break
+
+        finally:
+            self.logger.info("stopping...")
+            if self._flush_handle is not None:
+                self._flush_handle.cancel()
+                self._flush_handle = None
+            self.transport.close()
+            self.transport = None
+            self.stop_capture()
+            self.running = False
+            self.logger.info("stopped!")
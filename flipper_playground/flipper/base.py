@@ -1,39 +1,93 @@
+import logging
 import os
+import queue
+import select
 import sys
+import threading
 import time
+from contextlib import contextmanager
 from typing import Union
 
 from serial import Serial
-from serial.tools import list_ports
 
 from .draw import FlipperDraw
 from .input import FlipperInput
 from .hardware import FlipperHardware
-from ..protocol.protocols import ProtoID, ProtoParser, ProtoEventManager
+from .capture import Direction, SessionRecorder
+from .connection import ConnectionManager, FlipperConnectionError, PortCache
+from .reader import SerialReader
+from .stats import FlipperStats
+from .transport import Transport
+from ..protocol.framer import FrameBuffer
+from ..protocol.protocols import ProtoDispatcher, ProtoID, ProtoParser, ProtoEventManager
 from ..protocol.proto_utils import payload_e
 
 
+class _WriteBatch(threading.local):
+    # batches are per thread, so a helper thread writing in the background
+    # never lands in the middle of the event loop's batch
+    def __init__(self) -> None:
+        self.depth = 0
+        self.buffer = bytearray()
+        # whether this thread holds the write lock for the queued payloads
+        self.locked = False
+
+
 class Flipper(
     ProtoParser,
     ProtoEventManager,
+    ProtoDispatcher,
     FlipperDraw,
     FlipperInput,
     FlipperHardware,
 ):
-    def __init__(self):
+    def __init__(self, threaded_reader: bool = False, log_level: int = None, max_batch: int = 64):
+        if log_level is not None:
+            self.set_log_level(log_level)
         self.serial: Serial = None
+        self.reader: SerialReader = None
+        self.threaded_reader: bool = threaded_reader
         self.running: bool = False
+        self.max_batch: int = max_batch
+        self._write_batch = _WriteBatch()
+        self._write_lock = threading.RLock()
+        self._frame_buffer = FrameBuffer()
+        self.stats: FlipperStats = None
+        self.recorder: SessionRecorder = None
+        self.connection: ConnectionManager = None
+        self.start_delay: float = 0.1
         super().__init__()
 
+    def enable_stats(self, dump_interval: float = None) -> FlipperStats:
+        self.stats = FlipperStats(dump_interval)
+        if self.reader is not None:
+            self.reader.stats = self.stats
+        return self.stats
+
+    def start_capture(self, path: str) -> SessionRecorder:
+        self.stop_capture()
+        self.recorder = SessionRecorder(path)
+        return self.recorder
+
+    def stop_capture(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def disable_stats(self):
+        self.stats = None
+        if self.reader is not None:
+            self.reader.stats = None
+
     def open_serial(self, port=None, timeout=2):
         serial_port = port or self._find_port()
 
         if serial_port is None:
-            print("can not find Flipper serial dev")
+            self.logger.error("can not find Flipper serial dev")
             sys.exit(0)
 
         if not os.path.exists(serial_port):
-            print(f"can not open {serial_port}")
+            self.logger.error("can not open %s", serial_port)
             sys.exit(0)
 
         # open serial port
@@ -44,42 +98,237 @@ class Flipper(
 
         self.serial.timeout = timeout
 
+    def connect(self, port: str = None, serial_number: str = None, timeout: float = 2, **options) -> ConnectionManager:
+        # unlike open_serial, a lost connection is reopened by the event loop and the session resumed
+        self.connection = ConnectionManager(port, serial_number, timeout, **options)
+        self.serial = self.connection.open()
+        return self.connection
+
+    def open_transport(self, transport: Transport):
+        # any object with the Serial read/read_until/write/in_waiting/close api can drive the event loop
+        self.serial = transport
+
     def _find_port(self) -> Union[str, None]:
-        # COM4: USB Serial Device (COM4) [USB VID:PID=0483:5740 SER=FLIP_UNYANA LOCATION=1-3:x.0]
-        # /dev/cu.usbmodemflip_Unyana1: Flipper Unyana [USB VID:PID=0483:5740 SER=flip_Unyana LOCATION=20-2]
-        ports = list_ports.comports()
-        for port, desc, hwid in ports:
-            a = hwid.split()
-            if "VID:PID=0483:5740" in a:
-                return port
-        return None
-
-    def receive(self) -> (ProtoID, bytes):
-        id_raw = self.serial.read(2)
-        #print(f"id_raw: {id_raw}")
-        if len(id_raw) != 2:
-            return None, None
-        
-        id = int.from_bytes(id_raw, "little")
+        return PortCache().find()
 
-        data_size_raw = self.serial.read(4)
-        #print(f"data_size_raw: {data_size_raw}")
-        if len(data_size_raw) != 4:
-            return None, None
-        
-        data_size = int.from_bytes(data_size_raw, "little")
-        if data_size == 0:
+    def input_pending(self) -> bool:
+        if self.reader is not None:
+            return not self.reader.frames.empty()
+        return self._frame_buffer.has_frame() or self.serial.in_waiting > 0
+
+    def link_idle(self) -> bool:
+        return not self.input_pending() and getattr(self.serial, "out_waiting", 0) == 0
+
+    def receive(self, timeout: float = None) -> (ProtoID, bytes):
+        id, data = self.receive_raw(timeout)
+        if data is None:
             return id, None
+        return id, self._parse_timed(id, data)
+
+    def receive_raw(self, timeout: float = None) -> (ProtoID, bytes):
+        id, data = self._receive_frame(timeout)
+        if id is not None and self.recorder is not None:
+            self.recorder.record(Direction.Received, id, data)
+        return id, data
+
+    def _receive_frame(self, timeout: float = None) -> (ProtoID, bytes):
+        if self.reader is not None:
+            return self._receive_from_reader(timeout)
+
+        frames = self._frame_buffer
+        frame = frames.next_frame()
+        if frame is None:
+            if timeout is not None and not self._wait_readable(timeout):
+                return None, None
+            frame = self._fill_frame()
+            if frame is None:
+                return None, None
+
+        id, data = frame
+        if data is None:
+            if self.stats is not None:
+                self.stats.count_in(6)
+            return id, None
+
+        if self.stats is not None:
+            self.stats.count_in(6 + len(data))
+        # only zero copy handlers get the view, anything else may keep a reference to the payload
+        if id not in self.zero_copy_ids:
+            data = bytes(data)
+        return id, data
 
-        data = self.serial.read(data_size)
-        if len(data) != data_size:
+    def _fill_frame(self) -> tuple[int, memoryview]:
+        # read everything already waiting in one go, but at least the rest of the next frame
+        frames = self._frame_buffer
+        serial = self.serial
+        stats = self.stats
+        while True:
+            waiting = serial.in_waiting
+            size = max(frames.needed(), min(waiting, frames.capacity))
+            # only bulk reads of already buffered bytes are timed, a blocking read includes idle time
+            if stats is not None and waiting:
+                start = time.perf_counter_ns()
+
+            read = serial.readinto(frames.writable(size))
+            if stats is not None and waiting:
+                stats.record("read", time.perf_counter_ns() - start)
+            if not read:
+                return None
+
+            frames.commit(read)
+            frame = frames.next_frame()
+            if frame is not None:
+                return frame
+
+    def _wait_readable(self, timeout: float) -> bool:
+        if self.serial.in_waiting:
+            return True
+
+        # select only takes sockets on Windows, and pyserial's Windows port has no usable fileno
+        if os.name != "nt" and hasattr(self.serial, "fileno"):
+            try:
+                readable, _, _ = select.select([self.serial], [], [], timeout)
+                return bool(readable)
+            except (OSError, ValueError):
+                # io.UnsupportedOperation is both
+                pass
+
+        deadline = time.monotonic() + timeout
+        while not self.serial.in_waiting:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.001)
+        return True
+
+    def _receive_from_reader(self, timeout: float = None) -> (ProtoID, bytes):
+        try:
+            return self.reader.get(timeout=self.serial.timeout if timeout is None else timeout)
+        except queue.Empty:
             return None, None
 
-        return id, self.parse_bytes(id, data)
+    def _parse_timed(self, id: ProtoID, data: bytes):
+        stats = self.stats
+        if stats is None:
+            return self.parse_bytes(id, data)
+
+        start = time.perf_counter_ns()
+        parsed = self.parse_bytes(id, data)
+        stats.record("parse", time.perf_counter_ns() - start)
+        return parsed
+
+    def _handle_event_timed(self, id: ProtoID, data: object=None):
+        stats = self.stats
+        if stats is None:
+            self.handle_event(id, data)
+            return
+
+        start = time.perf_counter_ns()
+        self.handle_event(id, data)
+        stats.record("dispatch", time.perf_counter_ns() - start)
+        if stats.due():
+            self.logger.info("stats:\n%s", stats.format())
+
+    def _receive_batch(self, id: ProtoID, data: bytes) -> list[tuple[ProtoID, bytes]]:
+        # drain frames that are already buffered so they are handled and drawn together
+        events = [(id, data)]
+        while len(events) < self.max_batch and id != ProtoID.CNT_FLIPPER_STOP_ID and self.input_pending():
+            id, data = self.receive_raw()
+            if id is None:
+                break
+            events.append((id, data))
+        return events
+
+    def _dispatch_events(self, events: list[tuple[ProtoID, bytes]]):
+        stats = self.stats
+        if stats is not None:
+            # the fused table hides the parse stage, so stats use the separate steps
+            parsed = [(id, None if data is None else self._parse_timed(id, data)) for id, data in events]
+            start = time.perf_counter_ns()
+            with self.defer_view():
+                self.handle_events(parsed)
+            stats.record("dispatch", time.perf_counter_ns() - start)
+            if stats.due():
+                self.logger.info("stats:\n%s", stats.format())
+            return
+
+        table = self.dispatch_table
+        if table is None:
+            table = self.compile_dispatch_table()
+
+        batch_event_handlers = self.batch_event_handlers
+        batches = None
+        with self.defer_view():
+            for id, data in events:
+                entry = table.get(id)
+                data = entry(data) if entry is not None else self._dispatch_unknown(id, data)
+                if batch_event_handlers and id in batch_event_handlers:
+                    if batches is None:
+                        batches = {}
+                    batches.setdefault(id, []).append(data)
+            if batches:
+                self.handle_batches(batches)
 
     def send(self, id: ProtoID, data: bytes = b''):
-        print(f"send: {id}, {data}")
-        self.serial.write(payload_e(id, data))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("send: %s, %s", id, data)
+        self.write(payload_e(id, data))
+
+    def write(self, payload: bytes):
+        if self.stats is not None:
+            self.stats.count_out(len(payload))
+        if self.recorder is not None:
+            self.recorder.record_payload(Direction.Sent, payload)
+        write_batch = self._write_batch
+        if write_batch.depth:
+            if not write_batch.locked:
+                # held until the batch is flushed, so no other thread's write can overtake queued payloads,
+                # e.g. the sequencer changing hardware state a handler has already changed
+                self._write_lock.acquire()
+                write_batch.locked = True
+            write_batch.buffer += payload
+            return
+        self._write_serial(payload)
+
+    def _write_serial(self, payload: bytes):
+        stats = self.stats
+        if stats is None:
+            with self._write_lock:
+                self.serial.write(payload)
+            return
+
+        start = time.perf_counter_ns()
+        with self._write_lock:
+            self.serial.write(payload)
+        stats.record("write", time.perf_counter_ns() - start)
+
+    @contextmanager
+    def batch(self):
+        # queue every payload written inside the block and send them in one write at the end
+        write_batch = self._write_batch
+        write_batch.depth += 1
+        try:
+            yield
+        finally:
+            write_batch.depth -= 1
+            if write_batch.depth == 0:
+                self.flush_writes()
+
+    def flush_writes(self):
+        write_batch = self._write_batch
+        if not write_batch.buffer:
+            return
+        payload = bytes(write_batch.buffer)
+        write_batch.buffer.clear()
+        try:
+            self._write_serial(payload)
+        finally:
+            self._release_write_batch()
+
+    def _release_write_batch(self):
+        write_batch = self._write_batch
+        if write_batch.locked:
+            write_batch.locked = False
+            self._write_lock.release()
 
     def send_close(self):
         self.send(ProtoID.CNT_PYTHON_STOP_ID)
@@ -96,47 +345,138 @@ class Flipper(
             return func
         return decorator
 
-    def event_loop(self):
+    def event_loop(self, reconnect: bool = None):
         if self.running:
             # error
             return
 
+        if reconnect is None:
+            reconnect = self.connection is not None
+
         # start running
         self.running = True
+        self.reset_view()
+        self.reset_hardware_state()
+        self._frame_buffer.clear()
 
         try:
-            # ignore the header
-            out = self.serial.read_until(b">: ").decode("utf-8")
-
-            # run the python playground command
-            print("starting...")
-            self.serial.write(b"python_playground\r\n")
-            self.serial.read_until(b"python_playground\r\n")
-
-            id, data = self.receive()
-            if id != ProtoID.CNT_FLIPPER_START_ID:
-                print("failed to start")
-                sys.exit(0)
-
-            # Wait for flipper to enter the main loop
-            time.sleep(0.1)
-            self.handle_event(id, data)
-
-            print("started!")
-
+            resume = False
             while self.running:
-                id, data = self.receive()
-                if id is None:
-                    continue
-                self.handle_event(id, data)
-                if id == ProtoID.CNT_FLIPPER_STOP_ID:
+                try:
+                    self._run_session(resume)
                     break
+                except OSError as e:
+                    # serial errors are OSErrors too, e.g. the cable was pulled
+                    if not reconnect:
+                        if isinstance(e, FlipperConnectionError):
+                            self.logger.error("%s", e)
+                            sys.exit(0)
+                        raise
+                    self.logger.warning("connection lost: %s", e)
+                    self._close_session()
+                    self._reconnect()
+                    resume = True
 
         except KeyboardInterrupt:
             pass
 
         finally:
-            print("stopping...")
-            self.serial.close()
+            self.logger.info("stopping...")
+            self._close_session()
+            # the capture spans reconnects, it ends with the event loop
+            self.stop_capture()
             self.running = False
-            print("stopped!")
+            self.logger.info("stopped!")
+
+    def _handshake(self):
+        # ask for a fresh prompt, the banner may have been printed before the port was opened
+        self.serial.write(b"\r\n")
+        self.serial.read_until(b">: ")
+
+        # run the python playground command
+        self.logger.info("starting...")
+        self.serial.write(b"python_playground\r\n")
+        self.serial.read_until(b"python_playground\r\n")
+
+    def _run_session(self, resume: bool = False):
+        id, data = self._open_session()
+        # Wait for flipper to enter the main loop
+        time.sleep(self.start_delay)
+        self._begin_session(id, data, resume)
+
+        while self.running:
+            # views into the frame buffer are no longer referenced once a batch is dispatched
+            self._frame_buffer.rewind()
+            # wake up in time to flush a deferred frame
+            id, data = self.receive_raw(self.view_flush_timeout())
+            if id is None:
+                if not self.serial.is_open:
+                    raise FlipperConnectionError("connection closed")
+                with self.batch():
+                    self.flush_view()
+                if self.stats is not None and self.stats.due():
+                    self.logger.info("stats:\n%s", self.stats.format())
+                continue
+            events = self._receive_batch(id, data)
+            with self.batch():
+                self._dispatch_events(events)
+                self.flush_view()
+            if events[-1][0] == ProtoID.CNT_FLIPPER_STOP_ID:
+                break
+
+    def _open_session(self) -> tuple[ProtoID, object]:
+        self._handshake()
+
+        # hand the port over to the reader thread once the cli echo is consumed
+        if self.threaded_reader:
+            self.reader = SerialReader(self.serial)
+            self.reader.stats = self.stats
+            self.reader.start()
+
+        id, data = self.receive()
+        if id != ProtoID.CNT_FLIPPER_START_ID:
+            raise FlipperConnectionError("failed to start")
+        return id, data
+
+    def _begin_session(self, id: ProtoID, data: object, resume: bool = False):
+        if resume:
+            # the app state lives here, so a new playground session only needs the device state back
+            self.reset_hardware_state()
+            with self.batch():
+                self.restore_view()
+            self.logger.info("resumed!")
+        else:
+            with self.batch():
+                self._handle_event_timed(id, data)
+            self.logger.info("started!")
+
+        if self.connection is not None:
+            self.connection.connected()
+        self.compile_dispatch_table()
+
+    def _reconnect(self):
+        connection = self.connection
+        if connection is None:
+            raise FlipperConnectionError("can not reconnect a transport opened with open_transport")
+
+        while self.running:
+            time.sleep(connection.next_delay())
+            try:
+                self.serial = connection.open()
+                self.logger.info("reconnected after %s attempts", connection.failures)
+                return
+            except FlipperConnectionError as e:
+                self.logger.info("reconnect failed: %s", e)
+
+    def _close_session(self):
+        self._write_batch.buffer.clear()
+        self._write_batch.depth = 0
+        self._release_write_batch()
+        if self.reader is not None:
+            self.reader.stop()
+            self.reader = None
+        self._frame_buffer.clear()
+        try:
+            self.serial.close()
+        except OSError:
+            pass
@@ -0,0 +1,175 @@
+import mmap
+import struct
+import threading
+import time
+from enum import IntEnum
+
+from .transport import MemoryPipe, Transport
+from ..protocol.framer import PROTO_HEADER
+from ..protocol.protocols import ProtoID
+
+
+CAPTURE_MAGIC = b"FPCAP\x02"
+# byte length of the committed records, the file is grown in chunks so its size says nothing
+CAPTURE_LENGTH = struct.Struct("<Q")
+CAPTURE_HEADER_SIZE = len(CAPTURE_MAGIC) + CAPTURE_LENGTH.size
+CAPTURE_RECORD = struct.Struct("<QBHI")
+
+
+class Direction(IntEnum):
+    Received = 0
+    Sent = 1
+
+
+class SessionRecorder:
+    def __init__(self, path: str, chunk_size: int = 1 << 20) -> None:
+        self.path = path
+        self.chunk_size = chunk_size
+        self._file = open(path, "w+b")
+        self._file.truncate(chunk_size)
+        self._map = mmap.mmap(self._file.fileno(), chunk_size)
+        self._map[:len(CAPTURE_MAGIC)] = CAPTURE_MAGIC
+        self._offset = CAPTURE_HEADER_SIZE
+        self._commit()
+        self._start = time.monotonic_ns()
+        self._lock = threading.Lock()
+
+    def record(self, direction: Direction, id: int, data: bytes = None):
+        data = data or b""
+        size = CAPTURE_RECORD.size + len(data)
+        with self._lock:
+            if self._map is None:
+                return
+            if self._offset + size > len(self._map):
+                self._grow(self._offset + size)
+            CAPTURE_RECORD.pack_into(self._map, self._offset, time.monotonic_ns() - self._start, direction, id, len(data))
+            self._map[self._offset + CAPTURE_RECORD.size:self._offset + size] = data
+            self._offset += size
+            # the record only counts once it is complete, so a capture that is never closed still reads back
+            self._commit()
+
+    def _commit(self):
+        CAPTURE_LENGTH.pack_into(self._map, len(CAPTURE_MAGIC), self._offset - CAPTURE_HEADER_SIZE)
+
+    def record_payload(self, direction: Direction, payload: bytes):
+        # a written payload can hold several frames, e.g. a coalesced batch
+        view = memoryview(payload)
+        offset = 0
+        while offset + PROTO_HEADER.size <= len(view):
+            id, data_size = PROTO_HEADER.unpack_from(view, offset)
+            offset += PROTO_HEADER.size
+            self.record(direction, id, view[offset:offset + data_size])
+            offset += data_size
+
+    def _grow(self, min_size: int):
+        new_size = len(self._map)
+        while new_size < min_size:
+            new_size += self.chunk_size
+        self._map.flush()
+        self._map.close()
+        self._file.truncate(new_size)
+        self._map = mmap.mmap(self._file.fileno(), new_size)
+
+    def close(self):
+        with self._lock:
+            if self._map is None:
+                return
+            self._map.flush()
+            self._map.close()
+            self._map = None
+            self._file.truncate(self._offset)
+            self._file.close()
+
+
+def read_capture(path: str) -> list[tuple[int, Direction, int, bytes]]:
+    with open(path, "rb") as f:
+        raw = f.read()
+
+    if not raw.startswith(CAPTURE_MAGIC):
+        raise ValueError(f"{path} is not a flipper playground capture")
+
+    if len(raw) < CAPTURE_HEADER_SIZE:
+        raise ValueError(f"{path} is a truncated flipper playground capture")
+    end = min(len(raw), CAPTURE_HEADER_SIZE + CAPTURE_LENGTH.unpack_from(raw, len(CAPTURE_MAGIC))[0])
+
+    records = []
+    offset = CAPTURE_HEADER_SIZE
+    while offset + CAPTURE_RECORD.size <= end:
+        timestamp, direction, id, data_size = CAPTURE_RECORD.unpack_from(raw, offset)
+        offset += CAPTURE_RECORD.size
+        if offset + data_size > end:
+            break
+        records.append((timestamp, Direction(direction), id, raw[offset:offset + data_size]))
+        offset += data_size
+    return records
+
+
+class ReplayTransport(Transport):
+    def __init__(self, path: str, realtime: bool = True, timeout: float = 2) -> None:
+        self.frames = [
+            (timestamp, id, data) for timestamp, direction, id, data in read_capture(path)
+            if direction == Direction.Received
+        ]
+        if not any(id == ProtoID.CNT_FLIPPER_STOP_ID for _, id, _ in self.frames):
+            # make sure the event loop ends with the replay
+            last = self.frames[-1][0] if self.frames else 0
+            self.frames.append((last, ProtoID.CNT_FLIPPER_STOP_ID, b""))
+
+        self.realtime = realtime
+        self.timeout = timeout
+        self.sent = bytearray()
+        self.rx = MemoryPipe()
+        self.rx.write(b"\r\n>: ")
+        self._command = bytearray()
+        self._thread: threading.Thread = None
+
+    @property
+    def is_open(self) -> bool:
+        return not self.rx.closed
+
+    @property
+    def in_waiting(self) -> int:
+        return len(self.rx)
+
+    def read(self, size: int = 1) -> bytes:
+        return self.rx.read(size, self.timeout)
+
+    def read_until(self, expected: bytes = b"\n") -> bytes:
+        return self.rx.read_until(expected, self.timeout)
+
+    def write(self, data: bytes) -> int:
+        if self._thread is not None:
+            self.sent += data
+            return len(data)
+
+        # the cli command that starts the playground triggers the replay
+        self._command += data
+        if self._command.endswith(b"\r\n"):
+            command = bytes(self._command)
+            self._command.clear()
+            self.rx.write(command)
+            if not command.strip():
+                # an empty line only asks for a new prompt
+                self.rx.write(b"\r\n>: ")
+                return len(data)
+            self._thread = threading.Thread(target=self._replay, name="flipper-replay", daemon=True)
+            self._thread.start()
+        return len(data)
+
+    def close(self):
+        self.rx.close()
+
+    def _replay(self):
+        start = time.monotonic_ns()
+        first = self.frames[0][0] if self.frames else 0
+        for timestamp, id, data in self.frames:
+            if self.rx.closed:
+                return
+            if self.realtime:
+                delay = (timestamp - first) - (time.monotonic_ns() - start)
+                if delay > 0:
+                    time.sleep(delay / 1e9)
+            try:
+                self.rx.write(PROTO_HEADER.pack(id, len(data)) + data)
+            except BrokenPipeError:
+                return
@@ -0,0 +1,161 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+from serial import Serial, SerialException
+from serial.tools import list_ports
+
+
+FLIPPER_VID = 0x0483
+FLIPPER_PID = 0x5740
+
+
+class FlipperConnectionError(ConnectionError):
+    pass
+
+
+def default_port_cache_path() -> Path:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "flipper_playground" / "ports.json"
+
+
+def discover_ports() -> dict[str, str]:
+    # usb serial number -> device path of every connected Flipper, e.g. {"flip_Unyana": "/dev/ttyACM0"}
+    return {
+        port.serial_number or port.device: port.device
+        for port in list_ports.comports()
+        if port.vid == FLIPPER_VID and port.pid == FLIPPER_PID
+    }
+
+
+def port_serial_number(port: str) -> str:
+    # the usb serial number behind a device path, or None when it is not a Flipper (anymore)
+    if sys.platform.startswith("linux"):
+        # reads the sysfs entries of this one tty instead of enumerating every port
+        from serial.tools.list_ports_linux import SysFS
+        info = SysFS(port)
+    else:
+        info = next((info for info in list_ports.comports() if info.device == port), None)
+    if info is None or info.vid != FLIPPER_VID or info.pid != FLIPPER_PID:
+        return None
+    return info.serial_number or info.device
+
+
+class PortCache:
+    def __init__(self, path: str = None, persistent: bool = True) -> None:
+        self.path = Path(path) if path is not None else default_port_cache_path()
+        self.persistent = persistent
+        self.ports: dict[str, str] = self._load()
+
+    def find(self, serial_number: str = None) -> str:
+        # on linux a cached device path that is still the same Flipper skips enumerating every port on the system,
+        # elsewhere verifying it already takes a full enumeration
+        port = self.lookup(serial_number)
+        if port is not None:
+            return port
+
+        ports = self.refresh()
+        if serial_number is not None:
+            return ports.get(serial_number)
+        return next(iter(ports.values()), None)
+
+    def lookup(self, serial_number: str = None) -> str:
+        if serial_number is not None:
+            candidates = [(serial_number, self.ports.get(serial_number))]
+        else:
+            candidates = list(self.ports.items())
+        stale = False
+        for cached_serial_number, port in candidates:
+            if port is None:
+                continue
+            # device paths are handed out again after a replug, so the path alone proves nothing
+            if os.path.exists(port) and port_serial_number(port) == cached_serial_number:
+                return port
+            del self.ports[cached_serial_number]
+            stale = True
+        if stale:
+            self._save()
+        return None
+
+    def refresh(self) -> dict[str, str]:
+        ports = discover_ports()
+        self.ports.update(ports)
+        self._save()
+        return ports
+
+    def forget(self, port: str):
+        # the device path went away or now belongs to something else, rescan next time
+        stale = [serial_number for serial_number, cached in self.ports.items() if cached == port]
+        for serial_number in stale:
+            del self.ports[serial_number]
+        if stale:
+            self._save()
+
+    def _load(self) -> dict[str, str]:
+        if not self.persistent:
+            return {}
+        try:
+            ports = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return {}
+        return ports if isinstance(ports, dict) else {}
+
+    def _save(self):
+        if not self.persistent:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(self.ports))
+            os.replace(tmp_path, self.path)
+        except OSError:
+            # a read only cache only costs a rescan
+            pass
+
+
+class ConnectionManager:
+    def __init__(
+        self,
+        port: str = None,
+        serial_number: str = None,
+        timeout: float = 2,
+        port_cache: PortCache = None,
+        backoff: float = 0.05,
+        max_backoff: float = 2.0,
+        max_attempts: int = None,
+    ) -> None:
+        self.port = port
+        self.serial_number = serial_number
+        self.timeout = timeout
+        self.port_cache = port_cache if port_cache is not None else PortCache()
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.failures: int = 0
+
+    def open(self) -> Serial:
+        port = self.port or self.port_cache.find(self.serial_number)
+        if port is None:
+            raise FlipperConnectionError("can not find Flipper serial dev")
+
+        try:
+            serial = Serial(port, timeout=self.timeout)
+            serial.baudrate = 230400
+            serial.flushOutput()
+            serial.flushInput()
+        except (SerialException, OSError) as e:
+            if self.port is None:
+                self.port_cache.forget(port)
+            raise FlipperConnectionError(f"can not open {port}: {e}") from e
+        return serial
+
+    def next_delay(self) -> float:
+        # exponential backoff between attempts, the first retry is almost immediate
+        self.failures += 1
+        if self.max_attempts is not None and self.failures > self.max_attempts:
+            raise FlipperConnectionError(f"giving up after {self.max_attempts} reconnect attempts")
+        return min(self.max_backoff, self.backoff * 2 ** (self.failures - 1))
+
+    def connected(self):
+        self.failures = 0
@@ -1,8 +1,23 @@
+import io
+import logging
+import os
+import time
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, Executor, ThreadPoolExecutor, wait
 from enum import IntEnum
+from typing import TYPE_CHECKING
 
-from ..protocol.icon import file2icon
+from .stats import FlipperStats
+from ..protocol.codec import DRAW_CODECS
+from ..protocol.framer import PROTO_HEADER
 from ..protocol.protocols import ProtoInterface
-from ..protocol.proto_utils import ProtoID, bytes_e, int8_e, int16_e, str_e, payload_e
+from ..protocol.proto_utils import ProtoID, bytes_e, int8_e, int16_e, payload_e
+
+# the icon pipeline imports Pillow and heatshrink2, so it is only loaded once an icon is sent
+if TYPE_CHECKING:
+    from .raster import CanvasRasterizer
+    from ..protocol.icon import Icon
+    from ..protocol.icon_cache import IconCache
 
 
 class Align(IntEnum):
@@ -44,85 +59,110 @@ class Canvas:
         return int16_e(self.draw_count) + self.draw_data
 
     def draw_str(self, x: int, y: int, msg: str):
-        draw_str_data = int8_e(x) + int8_e(y) + str_e(msg)
-        self._add_draw(ProtoID.GUI_DRAW_STR_ID, draw_str_data)
+        self._pack_draw(ProtoID.GUI_DRAW_STR_ID, x, y, msg)
 
     def draw_str_align(self, x:int, y: int, horizontal: Align, vertical: Align, msg: str):
-        draw_str_align_data = int8_e(x) + int8_e(y) + int8_e(horizontal) + int8_e(vertical) + str_e(msg)
-        self._add_draw(ProtoID.GUI_DRAW_STR_ALIGN_ID, draw_str_align_data)
+        self._pack_draw(ProtoID.GUI_DRAW_STR_ALIGN_ID, x, y, horizontal, vertical, msg)
 
     def draw_str_align_center(self, x: int, y: int, msg: str):
         self.draw_str_align(x, y, Align.Center, Align.Center, msg)
 
     def draw_frame(self, x, y, width, height):
-        draw_frame_data = int8_e(x) + int8_e(y) + int8_e(width) + int8_e(height)
-        self._add_draw(ProtoID.GUI_DRAW_FRAME_ID, draw_frame_data)
+        self._pack_draw(ProtoID.GUI_DRAW_FRAME_ID, x, y, width, height)
 
     def draw_rframe(self, x, y, width, height, radius):
-        draw_rframe_data = int8_e(x) + int8_e(y) + int8_e(width) + int8_e(height) + int8_e(radius)
-        self._add_draw(ProtoID.GUI_DRAW_RFRAME_ID, draw_rframe_data)
+        self._pack_draw(ProtoID.GUI_DRAW_RFRAME_ID, x, y, width, height, radius)
 
     def draw_icon(self, x, y, icon_id):
-        draw_icon_data = int8_e(x) + int8_e(y) + int8_e(icon_id)
-        self._add_draw(ProtoID.GUI_DRAW_ICON_ID, draw_icon_data)
+        self._pack_draw(ProtoID.GUI_DRAW_ICON_ID, x, y, icon_id)
 
     def draw_dot(self, x, y):
-        draw_dot_data = int8_e(x) + int8_e(y)
-        self._add_draw(ProtoID.GUI_DRAW_DOT_ID, draw_dot_data)
+        self._pack_draw(ProtoID.GUI_DRAW_DOT_ID, x, y)
     
     def draw_line(self, x1, y1, x2, y2):
-        draw_line_data = int8_e(x1) + int8_e(y1) + int8_e(x2) + int8_e(y2)
-        self._add_draw(ProtoID.GUI_DRAW_LINE_ID, draw_line_data)
+        self._pack_draw(ProtoID.GUI_DRAW_LINE_ID, x1, y1, x2, y2)
     
     def draw_circle(self, x, y, radius):
-        draw_circle_data = int8_e(x) + int8_e(y) + int8_e(radius)
-        self._add_draw(ProtoID.GUI_DRAW_CIRCLE_ID, draw_circle_data)
+        self._pack_draw(ProtoID.GUI_DRAW_CIRCLE_ID, x, y, radius)
     
     def draw_disc(self, x, y, radius):
-        draw_disc_data = int8_e(x) + int8_e(y) + int8_e(radius)
-        self._add_draw(ProtoID.GUI_DRAW_DISC_ID, draw_disc_data)
+        self._pack_draw(ProtoID.GUI_DRAW_DISC_ID, x, y, radius)
     
     def draw_triangle(self, x, y, base, height, direction):
-        draw_triangle_data = int8_e(x) + int8_e(y) + int8_e(base) + int8_e(height) + int8_e(direction)
-        self._add_draw(ProtoID.GUI_DRAW_TRIANGLE_ID, draw_triangle_data)
+        self._pack_draw(ProtoID.GUI_DRAW_TRIANGLE_ID, x, y, base, height, direction)
 
     def draw_glyph(self, x, y, glyph_char):
-        draw_glyph_data = int8_e(x) + int8_e(y) + int16_e(glyph_char)
-        self._add_draw(ProtoID.GUI_DRAW_GLYPH_ID, draw_glyph_data)
+        self._pack_draw(ProtoID.GUI_DRAW_GLYPH_ID, x, y, glyph_char)
 
     def draw_box(self, x, y, width, height):
-        draw_box_data = int8_e(x) + int8_e(y) + int8_e(width) + int8_e(height)
-        self._add_draw(ProtoID.GUI_DRAW_BOX_ID, draw_box_data)
+        self._pack_draw(ProtoID.GUI_DRAW_BOX_ID, x, y, width, height)
 
     def draw_rbox(self, x, y, width, height, radius):
-        draw_rbox_data = int8_e(x) + int8_e(y) + int8_e(width) + int8_e(height) + int8_e(radius)
-        self._add_draw(ProtoID.GUI_DRAW_RBOX_ID, draw_rbox_data)
+        self._pack_draw(ProtoID.GUI_DRAW_RBOX_ID, x, y, width, height, radius)
 
     def set_color(self, color: Color):
-        set_color_data = int8_e(color)
-        self._add_draw(ProtoID.GUI_SET_COLOR_ID, set_color_data)
+        self._pack_draw(ProtoID.GUI_SET_COLOR_ID, color)
     
     def set_color_inverted(self):
-        self._add_draw(ProtoID.GUI_SET_COLOR_INVERTED_ID, b'')
+        self._pack_draw(ProtoID.GUI_SET_COLOR_INVERTED_ID)
     
     def set_font(self, font: Font):
-        set_font_data = int8_e(font)
-        self._add_draw(ProtoID.GUI_SET_FONT_ID, set_font_data)
+        self._pack_draw(ProtoID.GUI_SET_FONT_ID, font)
 
     def set_font_direction(self, direction: CanvasDirection):
-        set_font_direction_data = int8_e(direction)
-        self._add_draw(ProtoID.GUI_SET_FONT_DIRECTION_ID, set_font_direction_data)
+        self._pack_draw(ProtoID.GUI_SET_FONT_DIRECTION_ID, direction)
 
-    def _add_draw(self, proto_id: ProtoID, data: bytes):
-        self.draw_data.extend(payload_e(proto_id, data))
+    def _pack_draw(self, proto_id: ProtoID, *args):
+        DRAW_CODECS[proto_id].append_to(self.draw_data, *args)
         self.draw_count += 1
 
 
+# icon id the adaptive encoding uploads full screen bitmaps under, reserved for it
+FRAME_ICON_ID = 255
+
+# a shorter command stream is always sent as is, an empty screen already takes about 140 bytes as a bitmap frame
+BITMAP_FRAME_MIN_SIZE = 128
+
+
+def check_icon_id(icon_id: int):
+    if icon_id == FRAME_ICON_ID:
+        raise ValueError(f"icon id {FRAME_ICON_ID} is reserved for adaptive frame encoding")
+
+
+def icon_add_data(icon_id: int, icon: "Icon") -> bytes:
+    return int8_e(icon_id) + int8_e(icon.width) + int8_e(icon.height) + bytes_e(icon.data)
+
+
 class FlipperDraw(ProtoInterface):
+    stats: FlipperStats = None
+
     def __init__(self) -> None:
         self._draw_callback: callable = None
+        self._last_draw_data: bytes = None
+        self._icons: dict[int, bytes] = {}
+        self.rasterizer: "CanvasRasterizer" = None
+        self.pixel_diff: bool = False
+        self.adaptive_encoding: bool = False
+        self._last_pixels = None
+        self._last_text: bytes = None
+        self.frame_interval: float = 0
+        self._view_dirty: bool = False
+        self._last_flush: float = 0.0
+        self._view_holds: int = 0
+        self._icon_cache: "IconCache" = None
         super().__init__()
 
+    @property
+    def icon_cache(self) -> "IconCache":
+        if self._icon_cache is None:
+            from ..protocol.icon_cache import IconCache
+            self._icon_cache = IconCache()
+        return self._icon_cache
+
+    @icon_cache.setter
+    def icon_cache(self, icon_cache: "IconCache"):
+        self._icon_cache = icon_cache
+
     def draw_callback(self):
         def decorator(func):
             self._draw_callback = func
@@ -132,16 +172,229 @@ class FlipperDraw(ProtoInterface):
     def set_draw_callback(self, func: callable):
         self._draw_callback = func
 
-    def send_draw(self, canvas: Canvas):
-        self.send(ProtoID.GUI_DRAW_ID, canvas.compile_draw_data())
+    def send_draw(self, canvas: Canvas, force: bool = False):
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter_ns()
+        draw_data = bytes(canvas.compile_draw_data())
+        if stats is not None:
+            stats.record("compile", time.perf_counter_ns() - start)
+
+        # the firmware redraws the whole screen for each GUI_DRAW_ID, so an identical frame is a no-op
+        if not force and draw_data == self._last_draw_data:
+            return
+
+        pixels = None
+        if self.pixel_diff and not force:
+            from .raster import text_commands
+
+            # only shapes and icons are compared by pixels, text has to match command for command
+            text = text_commands(draw_data)
+            pixels = self._render_pixels(draw_data, text=False)
+            same = (
+                self._last_pixels is not None
+                and text == self._last_text
+                and (pixels == self._last_pixels).all()
+            )
+            self._last_pixels = pixels
+            self._last_text = text
+            if same:
+                self._last_draw_data = draw_data
+                return
+        self._last_draw_data = draw_data
+
+        if self.adaptive_encoding and len(draw_data) >= BITMAP_FRAME_MIN_SIZE:
+            from .raster import has_text
+
+            # only shapes and icons rasterize exactly, the device's fonts are not available on the host
+            if not has_text(draw_data):
+                if pixels is None:
+                    pixels = self._render_pixels(draw_data)
+                bitmap_frame = self._encode_bitmap_frame(pixels)
+                if len(bitmap_frame) < PROTO_HEADER.size + len(draw_data):
+                    self.write(bitmap_frame)
+                    return
+        self.send(ProtoID.GUI_DRAW_ID, draw_data)
+
+    def enable_pixel_diff(self, rasterizer: "CanvasRasterizer" = None):
+        # also drop frames whose commands differ but render to the same pixels, at the cost of rasterizing each frame
+        self._use_rasterizer(rasterizer)
+        self.pixel_diff = True
+        self._last_pixels = None
+        self._last_text = None
+
+    def disable_pixel_diff(self):
+        self.pixel_diff = False
+        self._last_pixels = None
+        self._last_text = None
+
+    def enable_adaptive_encoding(self, rasterizer: "CanvasRasterizer" = None):
+        # send a dense frame as one compressed full screen bitmap when that is fewer bytes than its commands
+        self._use_rasterizer(rasterizer)
+        self.adaptive_encoding = True
+
+    def disable_adaptive_encoding(self):
+        self.adaptive_encoding = False
+
+    def _use_rasterizer(self, rasterizer: "CanvasRasterizer" = None):
+        if rasterizer is not None:
+            self.rasterizer = rasterizer
+        elif self.rasterizer is None:
+            from .raster import CanvasRasterizer
+            self.rasterizer = CanvasRasterizer()
+
+    def _render_pixels(self, draw_data: bytes, text: bool = True):
+        rasterizer = self.rasterizer
+        for payload in self._icons.values():
+            rasterizer.add_icon_data(payload)
+        return rasterizer.render(draw_data, text).copy()
+
+    def _encode_bitmap_frame(self, pixels) -> bytes:
+        from ..protocol.icon import image2icon
 
-    def send_icon_add(self, icon_id: int, file_path: str):
-        icon = file2icon(file_path)
-        print(icon)
-        self.send(ProtoID.GUI_ICON_ADD_ID, int8_e(icon_id) + int8_e(icon.width) + int8_e(icon.height) + bytes_e(icon.data))
+        # the frame icon is uploaded under a reserved id and drawn over the whole screen
+        icon = image2icon(pixels)
+        frame = Canvas()
+        frame.draw_icon(0, 0, FRAME_ICON_ID)
+        return payload_e(ProtoID.GUI_ICON_ADD_ID, icon_add_data(FRAME_ICON_ID, icon)) + payload_e(ProtoID.GUI_DRAW_ID, bytes(frame.compile_draw_data()))
+
+    def invalidate_view(self):
+        self._last_draw_data = None
+        self._last_pixels = None
+        self._last_text = None
+
+    def reset_view(self):
+        self._icons.clear()
+        self.invalidate_view()
+
+    def restore_view(self):
+        # a new playground session starts blank, upload the icons again and redraw the last frame
+        if self._icons:
+            self.write(b"".join(payload_e(ProtoID.GUI_ICON_ADD_ID, data) for data in self._icons.values()))
+        if self._last_draw_data is not None:
+            self.send(ProtoID.GUI_DRAW_ID, self._last_draw_data)
+
+    def send_icon_add(self, icon_id: int, image):
+        check_icon_id(icon_id)
+        if isinstance(image, (str, os.PathLike)):
+            icon = self.icon_cache.get(image)
+        else:
+            from ..protocol.icon import image2icon
+            icon = image2icon(image)
+        self.send_icon(icon_id, icon)
+
+    def send_icon(self, icon_id: int, icon: "Icon"):
+        check_icon_id(icon_id)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("icon add %s: %s", icon_id, icon)
+        data = icon_add_data(icon_id, icon)
+        self._icons[icon_id] = data
+        self.send(ProtoID.GUI_ICON_ADD_ID, data)
+        # a frame referencing this icon id must be redrawn even if its commands are unchanged
+        self.invalidate_view()
+
+    def send_icons_add(self, icons: dict[int, object], executor: Executor = None):
+        from ..protocol.icon import file2icon, image2icon
+
+        for icon_id in icons:
+            check_icon_id(icon_id)
+
+        own_executor = executor is None
+        if own_executor:
+            executor = ThreadPoolExecutor()
+
+        try:
+            ready: list[tuple[int, "Icon"]] = []
+            futures = {}
+            cache = self.icon_cache
+            for icon_id, image in icons.items():
+                if not isinstance(image, (str, os.PathLike)):
+                    futures[executor.submit(image2icon, image)] = (icon_id, None)
+                    continue
+
+                with open(image, "rb") as f:
+                    content = f.read()
+                key = cache.key(content)
+                icon = cache.lookup(key)
+                if icon is not None:
+                    ready.append((icon_id, icon))
+                else:
+                    future = executor.submit(file2icon, io.BytesIO(content), cache.window_sz2, cache.lookahead_sz2)
+                    futures[future] = (icon_id, key)
+
+            # cached icons go out while the rest are still compiling
+            self._write_icons(ready)
+
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                ready = []
+                for future in done:
+                    icon_id, key = futures[future]
+                    icon = future.result()
+                    if key is not None:
+                        cache.put(key, icon)
+                    ready.append((icon_id, icon))
+                self._write_icons(ready)
+        finally:
+            if own_executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        self.invalidate_view()
+
+    def _write_icons(self, icons: list[tuple[int, "Icon"]]):
+        if not icons:
+            return
+        for icon_id, icon in icons:
+            self._icons[icon_id] = icon_add_data(icon_id, icon)
+        self.write(b"".join(payload_e(ProtoID.GUI_ICON_ADD_ID, self._icons[icon_id]) for icon_id, _ in icons))
+
+    def set_frame_interval(self, interval: float):
+        self.frame_interval = interval
+
+    def link_idle(self) -> bool:
+        return True
 
     def update_view(self):
+        self._view_dirty = True
+        self.flush_view()
+
+    @contextmanager
+    def defer_view(self):
+        self._view_holds += 1
+        try:
+            yield
+        finally:
+            self._view_holds -= 1
+
+    def flush_view(self, force: bool = False):
+        if not self._view_dirty or self._view_holds:
+            return
+
+        # while input or output is backed up, render at most once per frame interval
+        now = time.monotonic()
+        if not force and self.frame_interval > 0 \
+        and now - self._last_flush < self.frame_interval \
+        and not self.link_idle():
+            return
+
+        self._view_dirty = False
+        self._last_flush = now
+        self.render_view()
+
+    def view_flush_timeout(self) -> float:
+        if not self._view_dirty:
+            return None
+        return max(0.0, self.frame_interval - (time.monotonic() - self._last_flush))
+
+    def render_view(self):
         canvas = Canvas()
         if self._draw_callback:
-            self._draw_callback(canvas)
+            stats = self.stats
+            if stats is None:
+                self._draw_callback(canvas)
+            else:
+                start = time.perf_counter_ns()
+                self._draw_callback(canvas)
+                stats.record("draw", time.perf_counter_ns() - start)
         self.send_draw(canvas)
@@ -1,3 +1,5 @@
+import threading
+from contextlib import contextmanager
 from enum import IntEnum
 
 from ..protocol.protocols import ProtoInterface
@@ -13,25 +15,94 @@ class Light(IntEnum):
 
 class FlipperHardware(ProtoInterface):
     def __init__(self) -> None:
+        # Flipper shares its write lock, so the shadow changes in the same order the commands hit the wire
+        if not hasattr(self, "_write_lock"):
+            self._write_lock = threading.RLock()
+        self.reset_hardware_state()
         super().__init__()
 
+    def reset_hardware_state(self):
+        with self.hardware_update():
+            # shadow of what the device is doing, None means unknown so the next command always goes out
+            self._speaker: bytes = None
+            self._speaker_playing: bool = None
+            self._vibrator: bool = None
+            self._lights: dict[Light, int] = {}
+
+    @contextmanager
+    def hardware_update(self):
+        # the shadow check, the command and the shadow update run as one step under the write lock,
+        # a write batch keeps holding it until it is flushed, so the commands reach the device
+        # in the same order the shadow changed
+        with self._write_lock:
+            yield
+
     def send_speaker_play(self, frequency: float, volume: float):
-        self.send(ProtoID.HW_SPEAKER_PLAY_ID, float32_e(frequency) + float32_e(volume))
+        with self.hardware_update():
+            state = float32_e(frequency) + float32_e(volume)
+            if self._speaker_playing and self._speaker == state:
+                return
+            self.send(ProtoID.HW_SPEAKER_PLAY_ID, state)
+            self._speaker = state
+            self._speaker_playing = True
 
     def send_speaker_stop(self):
-        self.send(ProtoID.HW_SPEAKER_STOP_ID)
+        with self.hardware_update():
+            if self._speaker_playing is False:
+                return
+            self.send(ProtoID.HW_SPEAKER_STOP_ID)
+            self._speaker_playing = False
 
     def send_speaker_change_volume(self, volume: float):
-        self.send(ProtoID.HW_SPEAKER_CHANGE_VOLUME_ID, float32_e(volume))
-    
+        with self.hardware_update():
+            volume_data = float32_e(volume)
+            if self._speaker_playing and self._speaker is not None and self._speaker[4:] == volume_data:
+                return
+            self.send(ProtoID.HW_SPEAKER_SET_VOLUME_ID, volume_data)
+            if self._speaker is not None:
+                self._speaker = self._speaker[:4] + volume_data
+
     def send_vibrator_on(self):
-        self.send(ProtoID.HW_VIBRATOR_ON_ID)
-    
+        with self.hardware_update():
+            if self._vibrator is True:
+                return
+            self.send(ProtoID.HW_VIBRATOR_ON_ID)
+            self._vibrator = True
+
     def send_vibrator_off(self):
-        self.send(ProtoID.HW_VIBRATOR_OFF_ID)
+        with self.hardware_update():
+            if self._vibrator is False:
+                return
+            self.send(ProtoID.HW_VIBRATOR_OFF_ID)
+            self._vibrator = False
 
     def send_light_set(self, light: Light, value: int):
-        self.send(ProtoID.HW_LIGHT_SET_ID, int8_e(light) + int8_e(value))
+        # only the channels that actually change go into the mask
+        with self.hardware_update():
+            mask = 0
+            for channel in Light:
+                if light & channel and self._lights.get(channel) != value:
+                    mask |= channel
+            if not mask:
+                return
+            self.send(ProtoID.HW_LIGHT_SET_ID, int8_e(mask) + int8_e(value))
+            for channel in Light:
+                if mask & channel:
+                    self._lights[channel] = value
+
+    def send_lights_set(self, values: dict[Light, int]):
+        # channels going to the same value share one masked write
+        masks: dict[int, int] = {}
+        for light, value in values.items():
+            for channel in Light:
+                if light & channel:
+                    masks[value] = masks.get(value, 0) | channel
+        with self.hardware_update():
+            for value, mask in masks.items():
+                self.send_light_set(mask, value)
     
     def send_light_sequence(self, sequence: str):
-        self.send(ProtoID.HW_LIGHT_SEQUENCE_ID, str_e(sequence))
+        with self.hardware_update():
+            self.send(ProtoID.HW_LIGHT_SEQUENCE_ID, str_e(sequence))
+            # the sequence leaves the channels in a state we do not track
+            self._lights.clear()
@@ -1,3 +1,4 @@
+import struct
 from enum import IntEnum
 
 from ..protocol.protocols import DataHandler, ProtoID, ProtoInterface
@@ -22,17 +23,87 @@ class InputType(IntEnum):
     MAX = 5
 
 
+# members indexed by value, so decoding an event is a tuple lookup instead of an enum call
+INPUT_KEYS: tuple[InputKey, ...] = tuple(InputKey)
+INPUT_TYPES: tuple[InputType, ...] = tuple(InputType)
+
+INPUT_EVENT = struct.Struct("<BB")
+
+
 class InputData(DataHandler):
-    def __init__(self, key: int, key_type: int):
-        self.key: InputKey = InputKey(key)
-        self.key_type: InputType = InputType(key_type)
+    __slots__ = ("key", "key_type", "count")
+
+    zero_copy = True
+
+    def __init__(self, key: int, key_type: int, count: int = 1):
+        try:
+            self.key: InputKey = INPUT_KEYS[key]
+            self.key_type: InputType = INPUT_TYPES[key_type]
+        except IndexError:
+            raise ValueError(f"invalid input event: key={key}, key_type={key_type}") from None
+        self.count: int = count
 
     def __str__(self):
-        return f"InputData(key={self.key}, key_type={self.key_type})"
+        return f"InputData(key={self.key}, key_type={self.key_type}, count={self.count})"
 
     @classmethod
-    def from_bytes(cls, data: bytes):
-        return cls(data[0], data[1])
+    def from_bytes(cls, data: bytes | memoryview):
+        return cls(*INPUT_EVENT.unpack_from(data))
+
+
+def _clicked_pairs(events: list[InputData]) -> set[int]:
+    # indexes of the press/release pairs whose short or long click is in the batch as well,
+    # a pair that started in an earlier batch is kept whole so handlers always see both halves
+    pressed: dict[InputKey, int] = {}
+    released: dict[InputKey, tuple[int, int]] = {}
+    clicked: set[InputKey] = set()
+    dropped = set()
+    for index, event in enumerate(events):
+        key, key_type = event.key, event.key_type
+        if key_type == InputType.Press:
+            pressed[key] = index
+            released.pop(key, None)
+            clicked.discard(key)
+        elif key_type == InputType.Release:
+            press = pressed.pop(key, None)
+            if press is None:
+                continue
+            if key in clicked:
+                clicked.discard(key)
+                dropped.update((press, index))
+            else:
+                released[key] = (press, index)
+        elif key_type in (InputType.Short, InputType.Long):
+            # a long click comes while the key is held, a short one around its release
+            if key in pressed:
+                clicked.add(key)
+            else:
+                pair = released.pop(key, None)
+                if pair is not None:
+                    dropped.update(pair)
+    return dropped
+
+
+def coalesce_inputs(events: list[InputData]) -> list[InputData]:
+    dropped = _clicked_pairs(events)
+    repeats: dict[InputKey, InputData] = {}
+    result = []
+    for index, event in enumerate(events):
+        # a press/release pair adds nothing when the same batch has its short or long click
+        if index in dropped:
+            continue
+
+        if event.key_type == InputType.Repeat:
+            repeat = repeats.get(event.key)
+            if repeat is not None:
+                repeat.count += event.count
+                continue
+            event = InputData(event.key, event.key_type, event.count)
+            repeats[event.key] = event
+        else:
+            repeats.pop(event.key, None)
+        result.append(event)
+    return result
 
 
 class FlipperInput(ProtoInterface):
@@ -40,8 +111,11 @@ class FlipperInput(ProtoInterface):
         self.add_data_handler(ProtoID.INPUT_ID, InputData)
         super().__init__()
 
-    def input_event(self):
+    def input_event(self, batch: bool = False, coalesce: bool = False):
         def decorator(func):
-            self.add_event_handler(ProtoID.INPUT_ID, func)
+            if batch:
+                self.add_batch_event_handler(ProtoID.INPUT_ID, func, coalesce_inputs if coalesce else None)
+            else:
+                self.add_event_handler(ProtoID.INPUT_ID, func)
             return func
         return decorator
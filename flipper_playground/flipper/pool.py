@@ -0,0 +1,200 @@
+import inspect
+import os
+import selectors
+import time
+
+from .base import Flipper
+from .draw import Canvas, check_icon_id, icon_add_data
+from ..protocol.protocols import ProtoID, ProtoLogging
+from ..protocol.proto_utils import payload_e
+
+
+class FlipperPool(ProtoLogging):
+    def __init__(self, devices: list[Flipper] = (), chunk_size: int = 4096) -> None:
+        self.devices: list[Flipper] = []
+        self.chunk_size = chunk_size
+        self.running: bool = False
+        self.selector: selectors.BaseSelector = None
+        self._icon_cache = None
+        self._fds: dict[Flipper, int] = {}
+        for flipper in devices:
+            self.add(flipper)
+
+    def add(self, flipper: Flipper) -> Flipper:
+        # every device keeps its own handlers, draw callback and state, the pool only owns the reading
+        if inspect.iscoroutinefunction(flipper.handle_event):
+            # the pool dispatches synchronously, an AsyncFlipper runs on its own asyncio loop
+            raise ValueError("an AsyncFlipper can not be pooled")
+        if flipper.threaded_reader:
+            raise ValueError("a pooled Flipper is read by the pool, not by a reader thread")
+        if not hasattr(flipper.serial, "fileno"):
+            raise ValueError("a pooled Flipper needs a serial port or transport with a fileno")
+
+        self.devices.append(flipper)
+        if self.running:
+            # hot plugged while the pool is running
+            self._start([flipper])
+        return flipper
+
+    def remove(self, flipper: Flipper):
+        if flipper not in self.devices:
+            return
+        self.devices.remove(flipper)
+        fd = self._fds.pop(flipper, None)
+        if fd is not None:
+            self.selector.unregister(fd)
+        flipper._close_session()
+        flipper.stop_capture()
+        flipper.running = False
+
+    def broadcast(self, id: ProtoID, data: bytes = b'', devices: list[Flipper] = None):
+        payload = payload_e(id, data)
+        for flipper in self.devices if devices is None else devices:
+            flipper.write(payload)
+
+    def broadcast_draw(self, canvas: Canvas, devices: list[Flipper] = None, force: bool = False):
+        # the canvas is compiled and framed once, each device only gets the bytes written
+        draw_data = bytes(canvas.compile_draw_data())
+        payload = payload_e(ProtoID.GUI_DRAW_ID, draw_data)
+        for flipper in self.devices if devices is None else devices:
+            if not force and draw_data == flipper._last_draw_data:
+                continue
+            flipper._last_draw_data = draw_data
+            flipper.write(payload)
+
+    def broadcast_icons_add(self, icons: dict[int, object], devices: list[Flipper] = None):
+        from ..protocol.icon import image2icon
+
+        encoded = {}
+        for icon_id, image in icons.items():
+            check_icon_id(icon_id)
+            if isinstance(image, (str, os.PathLike)):
+                icon = self.icon_cache.get(image)
+            else:
+                icon = image2icon(image)
+            encoded[icon_id] = icon_add_data(icon_id, icon)
+
+        payload = b"".join(payload_e(ProtoID.GUI_ICON_ADD_ID, data) for data in encoded.values())
+        for flipper in self.devices if devices is None else devices:
+            flipper._icons.update(encoded)
+            flipper.write(payload)
+            flipper.invalidate_view()
+
+    @property
+    def icon_cache(self):
+        if self._icon_cache is None:
+            from ..protocol.icon_cache import IconCache
+            self._icon_cache = IconCache()
+        return self._icon_cache
+
+    def event_loop(self):
+        if self.running:
+            # error
+            return
+
+        self.running = True
+        self.selector = selectors.DefaultSelector()
+        try:
+            self._start(list(self.devices))
+            while self.running and self.devices:
+                for key, _ in self.selector.select(self._flush_timeout()):
+                    self._read(key.data)
+                self._flush_views()
+
+        except KeyboardInterrupt:
+            pass
+
+        finally:
+            self.logger.info("stopping pool...")
+            for flipper in list(self.devices):
+                self.remove(flipper)
+            self.selector.close()
+            self.selector = None
+            self.running = False
+            self.logger.info("pool stopped!")
+
+    def stop(self):
+        self.running = False
+
+    def _start(self, devices: list[Flipper]):
+        # handshake every device first, so they all share one wait for the main loop
+        started = []
+        for flipper in devices:
+            flipper.running = True
+            flipper.reset_view()
+            flipper.reset_hardware_state()
+            flipper._frame_buffer.clear()
+            try:
+                started.append((flipper, flipper._open_session()))
+            except OSError as e:
+                self.logger.warning("device failed to start: %s", e)
+                self.remove(flipper)
+
+        if not started:
+            return
+        time.sleep(max(flipper.start_delay for flipper, _ in started))
+
+        for flipper, (id, data) in started:
+            flipper._begin_session(id, data)
+            self._fds[flipper] = flipper.serial.fileno()
+            self.selector.register(self._fds[flipper], selectors.EVENT_READ, flipper)
+            # the start frame may have been read together with the first events
+            self._dispatch_buffered(flipper)
+
+    def _read(self, flipper: Flipper):
+        frames = flipper._frame_buffer
+        # the previous batch is dispatched, so the unread tail can move to the front
+        frames.rewind()
+        stats = flipper.stats
+        if stats is not None:
+            start = time.perf_counter_ns()
+        try:
+            read = os.readv(self._fds[flipper], [frames.writable(max(frames.needed(), self.chunk_size - len(frames)))])
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self.logger.warning("device lost: %s", e)
+            self.remove(flipper)
+            return
+        if not read:
+            self.logger.warning("device lost: end of file")
+            self.remove(flipper)
+            return
+
+        if stats is not None:
+            stats.record("read", time.perf_counter_ns() - start)
+        frames.commit(read)
+        self._dispatch_buffered(flipper)
+
+    def _dispatch_buffered(self, flipper: Flipper):
+        frames = flipper._frame_buffer
+        try:
+            while frames.has_frame():
+                # receive_raw only takes complete frames from the buffer here, it never blocks on the port
+                events = []
+                while len(events) < flipper.max_batch and frames.has_frame():
+                    events.append(flipper.receive_raw())
+                with flipper.batch():
+                    flipper._dispatch_events(events)
+                    flipper.flush_view()
+                if any(id == ProtoID.CNT_FLIPPER_STOP_ID for id, _ in events):
+                    self.remove(flipper)
+                    return
+        except OSError as e:
+            self.logger.warning("device lost: %s", e)
+            self.remove(flipper)
+
+    def _flush_timeout(self) -> float:
+        timeouts = [timeout for flipper in self.devices if (timeout := flipper.view_flush_timeout()) is not None]
+        return min(timeouts) if timeouts else None
+
+    def _flush_views(self):
+        for flipper in list(self.devices):
+            if flipper.view_flush_timeout() is None:
+                continue
+            try:
+                with flipper.batch():
+                    flipper.flush_view()
+            except OSError as e:
+                self.logger.warning("device lost: %s", e)
+                self.remove(flipper)
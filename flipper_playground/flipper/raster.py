@@ -0,0 +1,426 @@
+import logging
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .draw import Align, Canvas, CanvasDirection, Color, Font
+from ..protocol.codec import DRAW_CODECS
+from ..protocol.framer import PROTO_HEADER
+from ..protocol.protocols import ProtoID, logger
+
+
+SCREEN_WIDTH = 128
+SCREEN_HEIGHT = 64
+
+# point sizes of Pillow's default font standing in for the firmware's u8g2 fonts
+FONT_SIZES: dict[Font, int] = {
+    Font.Primary: 10,
+    Font.Secondary: 9,
+    Font.Keyboard: 9,
+    Font.BigNumbers: 16,
+    Font.BatteryPercent: 7,
+}
+
+# u8g2 circle quadrants
+UPPER_RIGHT = 0x01
+UPPER_LEFT = 0x02
+LOWER_LEFT = 0x04
+LOWER_RIGHT = 0x08
+ALL_QUADRANTS = 0x0F
+
+TEXT_CACHE_SIZE = 256
+
+# Pillow's font only approximates the u8g2 fonts, so text pixels are never exact
+TEXT_DRAW_IDS = frozenset((ProtoID.GUI_DRAW_STR_ID, ProtoID.GUI_DRAW_STR_ALIGN_ID, ProtoID.GUI_DRAW_GLYPH_ID))
+FONT_IDS = frozenset((ProtoID.GUI_SET_FONT_ID, ProtoID.GUI_SET_FONT_DIRECTION_ID))
+
+# color in effect and number of commands before a text command
+TEXT_CONTEXT = struct.Struct("<BH")
+
+
+def default_fonts() -> dict[Font, object]:
+    from PIL import ImageFont
+
+    fonts = {}
+    for font, size in FONT_SIZES.items():
+        try:
+            fonts[font] = ImageFont.load_default(size)
+        except TypeError:
+            # Pillow before 10.1 only has the fixed size bitmap font
+            fonts[font] = ImageFont.load_default()
+    return fonts
+
+
+def text_commands(draw_data: Canvas | bytes) -> bytes:
+    # the exact bytes of every text, glyph and font command together with its color and position,
+    # frames whose text parts differ here differ on the device whatever the rasterizer draws
+    if isinstance(draw_data, Canvas):
+        draw_data = draw_data.compile_draw_data()
+    view = memoryview(draw_data)
+
+    text = bytearray()
+    color = Color.Black
+    offset = 2
+    for index in range(int.from_bytes(view[:2], "little")):
+        id, data_size = PROTO_HEADER.unpack_from(view, offset)
+        end = offset + PROTO_HEADER.size + data_size
+        if id == ProtoID.GUI_SET_COLOR_ID:
+            color = view[offset + PROTO_HEADER.size]
+        elif id == ProtoID.GUI_SET_COLOR_INVERTED_ID:
+            color = Color.White if color else Color.Black
+        elif id in TEXT_DRAW_IDS or id in FONT_IDS:
+            text += TEXT_CONTEXT.pack(color, index)
+            text += view[offset:end]
+        offset = end
+    return bytes(text)
+
+
+def has_text(draw_data: Canvas | bytes) -> bool:
+    if isinstance(draw_data, Canvas):
+        draw_data = draw_data.compile_draw_data()
+    view = memoryview(draw_data)
+
+    offset = 2
+    for _ in range(int.from_bytes(view[:2], "little")):
+        id, data_size = PROTO_HEADER.unpack_from(view, offset)
+        if id in TEXT_DRAW_IDS:
+            return True
+        offset += PROTO_HEADER.size + data_size
+    return False
+
+
+def line_points(x1: int, y1: int, x2: int, y2: int) -> list[tuple[int, int]]:
+    # bresenham, both end points included like u8g2_DrawLine
+    points = []
+    dx, dy = abs(x2 - x1), -abs(y2 - y1)
+    sx, sy = (1 if x1 < x2 else -1), (1 if y1 < y2 else -1)
+    error = dx + dy
+    while True:
+        points.append((x1, y1))
+        if x1 == x2 and y1 == y2:
+            return points
+        e2 = 2 * error
+        if e2 >= dy:
+            error += dy
+            x1 += sx
+        if e2 <= dx:
+            error += dx
+            y1 += sy
+
+
+class CanvasRasterizer:
+    def __init__(self, fonts: dict[Font, object] = None) -> None:
+        if np is None:
+            raise ImportError("CanvasRasterizer needs numpy")
+
+        self.pixels = np.zeros((SCREEN_HEIGHT, SCREEN_WIDTH), dtype=bool)
+        self.icons: dict[int, np.ndarray] = {}
+        self._fonts = fonts
+        self._icon_payloads: dict[int, bytes] = {}
+        self._mask = np.zeros_like(self.pixels)
+        self._text_cache: dict[tuple[Font, str], tuple["np.ndarray", "np.ndarray", int, int]] = {}
+        self.color = Color.Black
+        self.font = Font.Secondary
+        self.font_direction = CanvasDirection.LeftToRight
+
+    @property
+    def fonts(self) -> dict[Font, object]:
+        if self._fonts is None:
+            self._fonts = default_fonts()
+        return self._fonts
+
+    def add_icon(self, icon_id: int, width: int, height: int, data: bytes):
+        from ..protocol.icon import icon2xbm
+
+        xbm = np.frombuffer(icon2xbm(data), dtype=np.uint8).reshape(height, -1)
+        self.icons[icon_id] = np.unpackbits(xbm, axis=1, bitorder="little")[:, :width].astype(bool)
+
+    def add_icon_data(self, payload: bytes):
+        # a GUI_ICON_ADD_ID payload: id, width, height and the length-prefixed icon data
+        icon_id, width, height = payload[0], payload[1], payload[2]
+        if self._icon_payloads.get(icon_id) == payload:
+            return
+        self._icon_payloads[icon_id] = payload
+        size = int.from_bytes(payload[3:7], "little")
+        self.add_icon(icon_id, width, height, bytes(payload[7:7 + size]))
+
+    def feed(self, id: int, data: bytes):
+        # follow a captured or simulated session frame by frame
+        if id == ProtoID.GUI_ICON_ADD_ID:
+            self.add_icon_data(data)
+        elif id == ProtoID.GUI_DRAW_ID:
+            self.render(data)
+
+    def render(self, draw_data: Canvas | bytes, text: bool = True) -> "np.ndarray":
+        # text=False leaves out the text and glyphs, see text_commands for comparing those
+        if isinstance(draw_data, Canvas):
+            draw_data = draw_data.compile_draw_data()
+        view = memoryview(draw_data)
+
+        # the firmware resets the canvas before the app draws
+        self.pixels[:] = False
+        self.color = Color.Black
+        self.font = Font.Secondary
+        self.font_direction = CanvasDirection.LeftToRight
+
+        count = int.from_bytes(view[:2], "little")
+        offset = 2
+        for _ in range(count):
+            id, data_size = PROTO_HEADER.unpack_from(view, offset)
+            codec = DRAW_CODECS.get(id)
+            if codec is None:
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("rasterizer: skipping unsupported draw id %s", id)
+            elif text or id not in TEXT_DRAW_IDS:
+                self._draw(id, codec.unpack_from(view, offset))
+            offset += PROTO_HEADER.size + data_size
+        return self.pixels
+
+    def to_image(self):
+        from PIL import Image
+
+        return Image.fromarray(self.pixels)
+
+    def __str__(self) -> str:
+        return "\n".join("".join("#" if pixel else "." for pixel in row) for row in self.pixels)
+
+    def _draw(self, id: int, args: tuple):
+        if id == ProtoID.GUI_SET_COLOR_ID:
+            self.color = Color(args[0])
+            return
+        if id == ProtoID.GUI_SET_COLOR_INVERTED_ID:
+            # canvas_invert_color flips the color as a boolean, so XOR becomes White
+            self.color = Color.White if self.color else Color.Black
+            return
+        if id == ProtoID.GUI_SET_FONT_ID:
+            self.font = Font(args[0])
+            return
+        if id == ProtoID.GUI_SET_FONT_DIRECTION_ID:
+            self.font_direction = CanvasDirection(args[0])
+            return
+
+        if id == ProtoID.GUI_DRAW_TRIANGLE_ID:
+            # three separate lines on the device, so with XOR the shared corners toggle twice
+            for line in self._triangle_lines(*args):
+                self._mask[:] = False
+                self._plot(line_points(*line))
+                self._apply()
+            return
+
+        self._mask[:] = False
+        if id == ProtoID.GUI_DRAW_DOT_ID:
+            self._plot([args])
+        elif id == ProtoID.GUI_DRAW_LINE_ID:
+            self._plot(line_points(*args))
+        elif id == ProtoID.GUI_DRAW_FRAME_ID:
+            self._frame(*args)
+        elif id == ProtoID.GUI_DRAW_BOX_ID:
+            self._box(*args)
+        elif id == ProtoID.GUI_DRAW_RFRAME_ID:
+            self._rframe(*args)
+        elif id == ProtoID.GUI_DRAW_RBOX_ID:
+            self._rbox(*args)
+        elif id == ProtoID.GUI_DRAW_CIRCLE_ID:
+            self._circle(*args, ALL_QUADRANTS)
+        elif id == ProtoID.GUI_DRAW_DISC_ID:
+            self._disc(*args, ALL_QUADRANTS)
+        elif id == ProtoID.GUI_DRAW_ICON_ID:
+            self._icon(*args)
+        elif id == ProtoID.GUI_DRAW_STR_ID:
+            self._str(*args)
+        elif id == ProtoID.GUI_DRAW_STR_ALIGN_ID:
+            self._str_align(*args)
+        elif id == ProtoID.GUI_DRAW_GLYPH_ID:
+            self._str(args[0], args[1], chr(args[2]))
+        self._apply()
+
+    def _apply(self):
+        # u8g2 draw colors: Black sets pixels, White clears them, XOR toggles them
+        if self.color == Color.Black:
+            self.pixels |= self._mask
+        elif self.color == Color.White:
+            self.pixels &= ~self._mask
+        else:
+            self.pixels ^= self._mask
+
+    def _plot(self, points):
+        for x, y in points:
+            if 0 <= x < SCREEN_WIDTH and 0 <= y < SCREEN_HEIGHT:
+                self._mask[y, x] = True
+
+    def _box(self, x: int, y: int, width: int, height: int):
+        if width > 0 and height > 0:
+            self._mask[max(y, 0):max(y + height, 0), max(x, 0):max(x + width, 0)] = True
+
+    def _hline(self, x: int, y: int, width: int):
+        self._box(x, y, width, 1)
+
+    def _vline(self, x: int, y: int, height: int):
+        self._box(x, y, 1, height)
+
+    def _frame(self, x: int, y: int, width: int, height: int):
+        if width <= 0 or height <= 0:
+            return
+        self._hline(x, y, width)
+        self._hline(x, y + height - 1, width)
+        self._vline(x, y, height)
+        self._vline(x + width - 1, y, height)
+
+    def _circle_points(self, radius: int):
+        # the octant walk of u8g2_draw_circle
+        f = 1 - radius
+        ddf_x, ddf_y = 1, -2 * radius
+        x, y = 0, radius
+        yield x, y
+        while x < y:
+            if f >= 0:
+                y -= 1
+                ddf_y += 2
+                f += ddf_y
+            x += 1
+            ddf_x += 2
+            f += ddf_x
+            yield x, y
+
+    def _circle(self, x0: int, y0: int, radius: int, quadrants: int):
+        points = []
+        for x, y in self._circle_points(radius):
+            if quadrants & UPPER_RIGHT:
+                points += [(x0 + x, y0 - y), (x0 + y, y0 - x)]
+            if quadrants & UPPER_LEFT:
+                points += [(x0 - x, y0 - y), (x0 - y, y0 - x)]
+            if quadrants & LOWER_RIGHT:
+                points += [(x0 + x, y0 + y), (x0 + y, y0 + x)]
+            if quadrants & LOWER_LEFT:
+                points += [(x0 - x, y0 + y), (x0 - y, y0 + x)]
+        self._plot(points)
+
+    def _disc(self, x0: int, y0: int, radius: int, quadrants: int):
+        for x, y in self._circle_points(radius):
+            if quadrants & UPPER_RIGHT:
+                self._vline(x0 + x, y0 - y, y + 1)
+                self._vline(x0 + y, y0 - x, x + 1)
+            if quadrants & UPPER_LEFT:
+                self._vline(x0 - x, y0 - y, y + 1)
+                self._vline(x0 - y, y0 - x, x + 1)
+            if quadrants & LOWER_RIGHT:
+                self._vline(x0 + x, y0, y + 1)
+                self._vline(x0 + y, y0, x + 1)
+            if quadrants & LOWER_LEFT:
+                self._vline(x0 - x, y0, y + 1)
+                self._vline(x0 - y, y0, x + 1)
+
+    def _rframe(self, x: int, y: int, width: int, height: int, radius: int):
+        # same split into corner arcs and straight edges as u8g2_DrawRFrame
+        xl, yu = x + radius, y + radius
+        xr, yl = x + width - radius - 1, y + height - radius - 1
+        self._circle(xl, yu, radius, UPPER_LEFT)
+        self._circle(xr, yu, radius, UPPER_RIGHT)
+        self._circle(xl, yl, radius, LOWER_LEFT)
+        self._circle(xr, yl, radius, LOWER_RIGHT)
+
+        ww, hh = width - 2 * radius, height - 2 * radius
+        if ww >= 3:
+            self._hline(xl + 1, y, ww - 2)
+            self._hline(xl + 1, y + height - 1, ww - 2)
+        if hh >= 3:
+            self._vline(x, yu + 1, hh - 2)
+            self._vline(x + width - 1, yu + 1, hh - 2)
+
+    def _rbox(self, x: int, y: int, width: int, height: int, radius: int):
+        xl, yu = x + radius, y + radius
+        xr, yl = x + width - radius - 1, y + height - radius - 1
+        self._disc(xl, yu, radius, UPPER_LEFT)
+        self._disc(xr, yu, radius, UPPER_RIGHT)
+        self._disc(xl, yl, radius, LOWER_LEFT)
+        self._disc(xr, yl, radius, LOWER_RIGHT)
+
+        ww, hh = width - 2 * radius, height - 2 * radius
+        if ww >= 3:
+            self._box(xl + 1, y, ww - 2, radius + 1)
+            self._box(xl + 1, yl, ww - 2, radius + 1)
+        if hh >= 3:
+            self._box(x, yu + 1, width, hh - 2)
+
+    @staticmethod
+    def _triangle_lines(x: int, y: int, base: int, height: int, direction: int) -> list[tuple[int, int, int, int]]:
+        half = base // 2
+        if direction == CanvasDirection.BottomToTop:
+            return [(x - half, y, x + half, y), (x - half, y, x, y - height + 1), (x, y - height + 1, x + half, y)]
+        if direction == CanvasDirection.TopToBottom:
+            return [(x - half, y, x + half, y), (x - half, y, x, y + height - 1), (x, y + height - 1, x + half, y)]
+        if direction == CanvasDirection.RightToLeft:
+            return [(x, y - half, x, y + half), (x, y - half, x - height + 1, y), (x - height + 1, y, x, y + half)]
+        if direction == CanvasDirection.LeftToRight:
+            return [(x, y - half, x, y + half), (x, y - half, x + height - 1, y), (x + height - 1, y, x, y + half)]
+        return []
+
+    def _icon(self, x: int, y: int, icon_id: int):
+        icon = self.icons.get(icon_id)
+        if icon is None:
+            return
+
+        # transparent bitmap mode, only the set bits are drawn
+        height, width = icon.shape
+        top, left = max(y, 0), max(x, 0)
+        bottom, right = min(y + height, SCREEN_HEIGHT), min(x + width, SCREEN_WIDTH)
+        if top < bottom and left < right:
+            self._mask[top:bottom, left:right] = icon[top - y:bottom - y, left - x:right - x]
+
+    def _text(self, msg: str) -> tuple["np.ndarray", "np.ndarray", int, int]:
+        # rendering through Pillow dominates, and a frame mostly repeats the strings of the last one
+        key = (self.font, msg)
+        text = self._text_cache.get(key)
+        if text is not None:
+            return text
+
+        from PIL import Image, ImageDraw
+
+        font = self.fonts.get(self.font) or self.fonts[Font.Secondary]
+        if hasattr(font, "getmetrics"):
+            ascent, descent = font.getmetrics()
+        else:
+            ascent, descent = font.getbbox("A")[3], 0
+        width = int(font.getlength(msg))
+        image = Image.new("1", (width + 1, ascent + descent))
+        ImageDraw.Draw(image).text((0, 0), msg, font=font, fill=1)
+        rows, cols = np.nonzero(np.asarray(image))
+
+        if len(self._text_cache) >= TEXT_CACHE_SIZE:
+            del self._text_cache[next(iter(self._text_cache))]
+        text = self._text_cache[key] = (rows - ascent, cols, width, ascent)
+        return text
+
+    def _str(self, x: int, y: int, msg: str):
+        if not msg:
+            return
+        dy, cols, _, _ = self._text(msg)
+
+        # x and y are the left end of the baseline, the text is rotated around it for the font direction
+        if self.font_direction == CanvasDirection.TopToBottom:
+            xs, ys = x - dy, y + cols
+        elif self.font_direction == CanvasDirection.RightToLeft:
+            xs, ys = x - cols, y - dy
+        elif self.font_direction == CanvasDirection.BottomToTop:
+            xs, ys = x + dy, y - cols
+        else:
+            xs, ys = x + cols, y + dy
+
+        visible = (xs >= 0) & (xs < SCREEN_WIDTH) & (ys >= 0) & (ys < SCREEN_HEIGHT)
+        self._mask[ys[visible], xs[visible]] = True
+
+    def _str_align(self, x: int, y: int, horizontal: int, vertical: int, msg: str):
+        # the offsets canvas_draw_str_aligned applies before drawing at the baseline
+        _, _, width, ascent = self._text(msg)
+        if horizontal == Align.Right:
+            x -= width
+        elif horizontal == Align.Center:
+            x -= width // 2
+        if vertical == Align.Top:
+            y += ascent
+        elif vertical == Align.Center:
+            y += ascent // 2
+        self._str(x, y, msg)
@@ -0,0 +1,64 @@
+import queue
+import threading
+import time
+
+from serial import Serial, SerialException
+
+from ..protocol.framer import ProtoFramer
+
+
+class SerialReader:
+    def __init__(self, serial: Serial, chunk_size: int = 4096) -> None:
+        self.serial = serial
+        self.chunk_size = chunk_size
+        self.framer = ProtoFramer(chunk_size)
+        self._chunk = memoryview(bytearray(chunk_size))
+        self.frames: queue.Queue = queue.Queue()
+        self.error: Exception = None
+        self.stats = None
+        self.running: bool = False
+        self._thread: threading.Thread = None
+
+    def start(self):
+        if self.running:
+            return
+
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="flipper-serial-reader", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def get(self, timeout: float = None) -> tuple[int, bytes]:
+        if self.error is not None and self.frames.empty():
+            raise self.error
+        return self.frames.get(timeout=timeout)
+
+    def _run(self):
+        try:
+            while self.running:
+                # block for the first byte, then drain whatever else is already waiting
+                waiting = self.serial.in_waiting
+                stats = self.stats
+                if stats is not None and waiting:
+                    start = time.perf_counter_ns()
+
+                # read into the reusable chunk buffer, the framer copies it into its ring buffer anyway
+                size = self.serial.readinto(self._chunk[:min(waiting, self.chunk_size) or 1])
+                if not size:
+                    continue
+
+                # only bulk reads of already buffered bytes are timed, a blocking read includes idle time
+                if stats is not None and waiting:
+                    stats.record("read", time.perf_counter_ns() - start)
+                for frame in self.framer.feed(self._chunk[:size]):
+                    if stats is not None:
+                        stats.count_in(6 + (len(frame[1]) if frame[1] else 0))
+                    self.frames.put(frame)
+        except (SerialException, OSError) as e:
+            self.error = e
+            self.running = False
@@ -0,0 +1,194 @@
+import threading
+import time
+from contextlib import nullcontext
+
+from .hardware import FlipperHardware, Light
+
+
+class TimerWheel:
+    def __init__(self, slots: int = 256) -> None:
+        self.slots: list[list[tuple[int, object]]] = [[] for _ in range(slots)]
+        self.count = 0
+
+    def add(self, tick: int, item: object):
+        self.slots[tick % len(self.slots)].append((tick, item))
+        self.count += 1
+
+    def pop_due(self, first_tick: int, last_tick: int) -> list[object]:
+        # every slot is visited at most once, even when more than a full turn was missed
+        due = []
+        for tick in range(first_tick, min(last_tick, first_tick + len(self.slots) - 1) + 1):
+            slot = self.slots[tick % len(self.slots)]
+            if not slot:
+                continue
+            keep = []
+            for item_tick, item in slot:
+                if item_tick <= last_tick:
+                    due.append((item_tick, item))
+                else:
+                    keep.append((item_tick, item))
+            slot[:] = keep
+        self.count -= len(due)
+        due.sort(key=lambda entry: entry[0])
+        return [item for _, item in due]
+
+    def clear(self):
+        for slot in self.slots:
+            slot.clear()
+        self.count = 0
+
+
+class HardwareSequencer:
+    def __init__(self, hardware: FlipperHardware, tick: float = 0.01, slots: int = 256) -> None:
+        self.hardware = hardware
+        self.tick = tick
+        self.wheel = TimerWheel(slots)
+        self.running: bool = False
+        self._origin = time.monotonic()
+        self._current_tick = 0
+        self._generations: dict[str, int] = {}
+        self._stop_actions: dict[str, tuple] = {}
+        self._condition = threading.Condition()
+        self._thread: threading.Thread = None
+
+    def start(self):
+        if self.running:
+            return
+
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="flipper-sequencer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self.running = False
+            self.wheel.clear()
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def schedule(self, track: str, events: list[tuple[float, tuple]], stop_action: tuple = None):
+        with self._condition:
+            # a new timeline replaces whatever was still queued on the track
+            generation = self._generations.get(track, 0) + 1
+            self._generations[track] = generation
+            if stop_action is not None:
+                self._stop_actions[track] = stop_action
+
+            if self.wheel.count == 0:
+                self._current_tick = self._tick_at(time.monotonic())
+            start_tick = self._current_tick + 1
+            for offset, action in events:
+                self.wheel.add(start_tick + round(offset / self.tick), (track, generation, action))
+            self._condition.notify_all()
+
+    def cancel(self, track: str, silence: bool = True):
+        stop_action = self._stop_actions.get(track) if silence else None
+        if stop_action is not None:
+            self.schedule(track, [(0, stop_action)])
+            return
+
+        with self._condition:
+            self._generations[track] = self._generations.get(track, 0) + 1
+
+    def play_notes(self, notes: list[tuple[float, float, float]], track: str = "speaker"):
+        # notes are (frequency, volume, duration), a frequency of 0 is a rest
+        events = []
+        offset = 0.0
+        for frequency, volume, duration in notes:
+            events.append((offset, ("speaker", frequency, volume) if frequency > 0 else ("speaker_stop",)))
+            offset += duration
+        events.append((offset, ("speaker_stop",)))
+        self.schedule(track, events, ("speaker_stop",))
+
+    def light_keyframes(self, keyframes: list[tuple[float, dict[Light, int]]], track: str = "lights"):
+        # keyframes are (time, {light: value}) with times relative to now
+        channels = 0
+        for _, values in keyframes:
+            for light in values:
+                channels |= light
+        events = [(offset, ("lights", dict(values))) for offset, values in keyframes]
+        self.schedule(track, events, ("lights", {channels: 0}))
+
+    def vibrate(self, pattern: list[float], track: str = "vibrator"):
+        # pattern alternates on and off durations, starting with on
+        events = []
+        offset = 0.0
+        for index, duration in enumerate(pattern):
+            events.append((offset, ("vibrator", index % 2 == 0)))
+            offset += duration
+        events.append((offset, ("vibrator", False)))
+        self.schedule(track, events, ("vibrator", False))
+
+    def _tick_at(self, timestamp: float) -> int:
+        return int((timestamp - self._origin) / self.tick)
+
+    def _run(self):
+        while self.running:
+            with self._condition:
+                self._condition.wait_for(lambda: not self.running or self.wheel.count, None)
+                if not self.running:
+                    break
+                # deadlines come from the fixed origin, so sleep overshoot never accumulates
+                deadline = self._origin + (self._current_tick + 1) * self.tick
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    if time.monotonic() < deadline:
+                        continue
+
+                now_tick = self._tick_at(time.monotonic())
+                due = self.wheel.pop_due(self._current_tick + 1, now_tick)
+                self._current_tick = now_tick
+                actions = [
+                    action for track, generation, action in due
+                    if self._generations.get(track) == generation
+                ]
+
+            if actions:
+                self._apply(actions)
+
+    def _apply(self, actions: list[tuple]):
+        # everything due in the same tick is merged: the last speaker and vibrator state win
+        # and light changes are folded into as few masked writes as possible
+        speaker = None
+        vibrator = None
+        lights: dict[Light, int] = {}
+        for kind, *args in actions:
+            if kind == "speaker" or kind == "speaker_stop":
+                speaker = args
+            elif kind == "vibrator":
+                vibrator = args[0]
+            elif kind == "lights":
+                for light, value in args[0].items():
+                    for channel in Light:
+                        if light & channel:
+                            lights[channel] = value
+
+        hardware = self.hardware
+        batch = getattr(hardware, "batch", None)
+        # a handler holds the write lock for its whole batch, and may be the one stopping the sequencer
+        lock = hardware._write_lock
+        while not lock.acquire(timeout=self.tick):
+            if not self.running:
+                return
+        try:
+            # the event loop thread changes the same shadow state, so the whole tick is one update
+            with hardware.hardware_update(), batch() if batch is not None else nullcontext():
+                if speaker is not None:
+                    if speaker:
+                        hardware.send_speaker_play(*speaker)
+                    else:
+                        hardware.send_speaker_stop()
+                if vibrator is not None:
+                    if vibrator:
+                        hardware.send_vibrator_on()
+                    else:
+                        hardware.send_vibrator_off()
+                if lights:
+                    hardware.send_lights_set(lights)
+        except (OSError, ValueError):
+            hardware.logger.exception("sequencer failed to send hardware commands")
+        finally:
+            lock.release()
@@ -0,0 +1,142 @@
+import os
+import threading
+from typing import TYPE_CHECKING
+
+from .input import InputKey, InputType
+from .transport import FdTransport, MemoryTransport, Transport
+from ..protocol.framer import ProtoFramer
+from ..protocol.protocols import ProtoID
+from ..protocol.proto_utils import payload_e
+
+if TYPE_CHECKING:
+    from .raster import CanvasRasterizer
+
+
+class SimulatedFlipper:
+    banner = b"\r\nFlipper Zero Command Line Interface!\r\n"
+    prompt = b"\r\n>: "
+
+    def __init__(self, transport: Transport) -> None:
+        self.transport = transport
+        self.framer = ProtoFramer()
+        self.frames: list[tuple[int, bytes]] = []
+        self.running: bool = False
+        self.started = threading.Event()
+        self._frames_changed = threading.Condition()
+        self._thread: threading.Thread = None
+        self._pty_slave: int = None
+
+    @classmethod
+    def memory(cls, timeout: float = 2) -> tuple["SimulatedFlipper", MemoryTransport]:
+        host, device = MemoryTransport.pair(timeout)
+        return cls(device), host
+
+    @classmethod
+    def pty(cls) -> tuple["SimulatedFlipper", str]:
+        # tty pulls in termios, which only exists on posix
+        import tty
+
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        simulator = cls(FdTransport(master))
+        # keep the slave end open so the master does not hang up between host connections
+        simulator._pty_slave = slave
+        return simulator, os.ttyname(slave)
+
+    def start(self):
+        if self.running:
+            return
+
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="simulated-flipper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self.started.is_set() and self.transport.is_open:
+            self.send(ProtoID.CNT_FLIPPER_STOP_ID)
+        self.running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        self.transport.close()
+        if self._pty_slave is not None:
+            os.close(self._pty_slave)
+            self._pty_slave = None
+
+    def send(self, id: ProtoID, data: bytes = b''):
+        self.transport.write(payload_e(id, data))
+
+    def send_input(self, key: InputKey, key_type: InputType):
+        self.send(ProtoID.INPUT_ID, bytes([key, key_type]))
+
+    def received(self, proto_id: ProtoID) -> list[bytes]:
+        with self._frames_changed:
+            return [data for id, data in self.frames if id == proto_id]
+
+    def screen(self) -> "CanvasRasterizer":
+        # what the display shows after the frames received so far
+        from .raster import CanvasRasterizer
+
+        rasterizer = CanvasRasterizer()
+        with self._frames_changed:
+            frames = list(self.frames)
+        for id, data in frames:
+            rasterizer.feed(id, data)
+        return rasterizer
+
+    def wait_for(self, proto_id: ProtoID, count: int = 1, timeout: float = None) -> bool:
+        with self._frames_changed:
+            return self._frames_changed.wait_for(
+                lambda: sum(1 for id, _ in self.frames if id == proto_id) >= count,
+                timeout,
+            )
+
+    def _run(self):
+        try:
+            self._run_cli()
+        except OSError:
+            # the host closed its end of the connection
+            self.running = False
+
+    def _run_cli(self):
+        self.transport.write(self.banner + self.prompt)
+        line = b""
+        while self.running:
+            # a read can time out half way through a line, keep what arrived so far
+            line += self.transport.read_until(b"\r\n")
+            if not line.endswith(b"\r\n"):
+                if not self.transport.is_open:
+                    break
+                continue
+
+            self.transport.write(line)
+            command = line.strip()
+            line = b""
+            if command == b"python_playground":
+                self._run_playground()
+            elif command:
+                self.transport.write(b"`" + command + b"` command not found")
+            if self.running and self.transport.is_open:
+                self.transport.write(self.prompt)
+
+    def _run_playground(self):
+        self.framer.reset()
+        self.send(ProtoID.CNT_FLIPPER_START_ID)
+        self.started.set()
+
+        while self.running:
+            data = self.transport.read(self.transport.in_waiting or 1)
+            if not data:
+                if not self.transport.is_open:
+                    break
+                continue
+
+            for id, payload in self.framer.feed(data):
+                with self._frames_changed:
+                    self.frames.append((id, payload))
+                    self._frames_changed.notify_all()
+                if id == ProtoID.CNT_PYTHON_STOP_ID:
+                    return
@@ -0,0 +1,133 @@
+import time
+
+
+class Histogram:
+    def __init__(self, significant_bits: int = 5) -> None:
+        # log-linear buckets: values below 2**significant_bits are exact, above that every
+        # power of two range is split into 2**(significant_bits - 1) buckets (about 3% error for 5 bits)
+        self.significant_bits = significant_bits
+        self._half = 1 << (significant_bits - 1)
+        self.counts: list[int] = [0] * ((66 - significant_bits) * self._half)
+        self.reset()
+
+    def reset(self):
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.count = 0
+        self.total = 0
+        self.min: int = None
+        self.max: int = None
+
+    def _index(self, value: int) -> int:
+        shift = value.bit_length() - self.significant_bits
+        if shift <= 0:
+            return value
+        return (shift + 1) * self._half + (value >> shift) - self._half
+
+    def _value(self, index: int) -> int:
+        if index < 2 * self._half:
+            return index
+        shift = index // self._half - 1
+        return (index % self._half + self._half) << shift
+
+    def record(self, value: int):
+        value = max(0, int(value))
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, percentile: float) -> int:
+        if self.count == 0:
+            return 0
+
+        target = max(1, round(self.count * percentile / 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self._value(index), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class FlipperStats:
+    stages = ("read", "parse", "dispatch", "draw", "compile", "write")
+
+    def __init__(self, dump_interval: float = None) -> None:
+        self.histograms: dict[str, Histogram] = {stage: Histogram() for stage in self.stages}
+        self.dump_interval = dump_interval
+        self.reset()
+
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.reset()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.frames_in = 0
+        self.frames_out = 0
+        self.started_at = time.monotonic()
+        self.last_dump = self.started_at
+
+    def record(self, stage: str, duration_ns: int):
+        self.histograms[stage].record(duration_ns)
+
+    def count_in(self, size: int):
+        self.frames_in += 1
+        self.bytes_in += size
+
+    def count_out(self, size: int, frames: int = 1):
+        self.frames_out += frames
+        self.bytes_out += size
+
+    def due(self) -> bool:
+        if self.dump_interval is None:
+            return False
+        now = time.monotonic()
+        if now - self.last_dump < self.dump_interval:
+            return False
+        self.last_dump = now
+        return True
+
+    def snapshot(self) -> dict:
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        stages = {}
+        for stage, histogram in self.histograms.items():
+            stages[stage] = {
+                "count": histogram.count,
+                "mean_us": histogram.mean / 1000,
+                "min_us": (histogram.min or 0) / 1000,
+                "p50_us": histogram.percentile(50) / 1000,
+                "p90_us": histogram.percentile(90) / 1000,
+                "p99_us": histogram.percentile(99) / 1000,
+                "max_us": (histogram.max or 0) / 1000,
+            }
+
+        return {
+            "elapsed_s": elapsed,
+            "stages": stages,
+            "bytes_in_per_s": self.bytes_in / elapsed,
+            "bytes_out_per_s": self.bytes_out / elapsed,
+            "frames_in_per_s": self.frames_in / elapsed,
+            "frames_out_per_s": self.frames_out / elapsed,
+        }
+
+    def format(self) -> str:
+        snapshot = self.snapshot()
+        lines = [f"{'stage':<10}{'count':>8}{'p50 us':>10}{'p90 us':>10}{'p99 us':>10}{'max us':>10}"]
+        for stage, values in snapshot["stages"].items():
+            lines.append(
+                f"{stage:<10}{values['count']:>8}{values['p50_us']:>10.1f}{values['p90_us']:>10.1f}"
+                f"{values['p99_us']:>10.1f}{values['max_us']:>10.1f}"
+            )
+        lines.append(
+            f"in: {snapshot['frames_in_per_s']:.1f} frames/s {snapshot['bytes_in_per_s']:.0f} B/s, "
+            f"out: {snapshot['frames_out_per_s']:.1f} frames/s {snapshot['bytes_out_per_s']:.0f} B/s"
+        )
+        return "\n".join(lines)
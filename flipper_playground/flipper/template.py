@@ -0,0 +1,58 @@
+from .draw import Canvas
+from ..protocol.codec import DRAW_CODECS
+from ..protocol.proto_utils import ProtoID
+
+
+class Slot:
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __repr__(self) -> str:
+        return f"Slot({self.name!r})"
+
+
+class CanvasTemplate(Canvas):
+    def __init__(self) -> None:
+        super().__init__()
+        self.slots: set[str] = set()
+        self._parts: list = []
+
+    def render(self, **values) -> Canvas:
+        canvas = Canvas()
+        self.render_into(canvas, **values)
+        return canvas
+
+    def render_into(self, canvas: Canvas, **values):
+        self._close_static()
+        draw_data = canvas.draw_data
+        for part in self._parts:
+            if part.__class__ is bytes:
+                draw_data += part
+                continue
+
+            codec, args, slot_indexes = part
+            resolved = list(args)
+            for index in slot_indexes:
+                resolved[index] = values[args[index].name]
+            codec.append_to(draw_data, *resolved)
+        canvas.draw_count += self.draw_count
+
+    def compile_draw_data(self):
+        raise TypeError("CanvasTemplate must be rendered into a Canvas before compiling")
+
+    def _pack_draw(self, proto_id: ProtoID, *args):
+        slot_indexes = tuple(i for i, arg in enumerate(args) if isinstance(arg, Slot))
+        if not slot_indexes:
+            super()._pack_draw(proto_id, *args)
+            return
+
+        self._close_static()
+        self._parts.append((DRAW_CODECS[proto_id], args, slot_indexes))
+        self.slots.update(args[i].name for i in slot_indexes)
+        self.draw_count += 1
+
+    def _close_static(self):
+        # flush the static commands recorded so far into a single compiled chunk
+        if self.draw_data:
+            self._parts.append(bytes(self.draw_data))
+            self.draw_data.clear()
@@ -0,0 +1,218 @@
+import os
+import select
+import threading
+import time
+
+
+class Transport:
+    timeout: float = None
+
+    @property
+    def is_open(self) -> bool:
+        return True
+
+    @property
+    def in_waiting(self) -> int:
+        raise NotImplementedError
+
+    def read(self, size: int = 1) -> bytes:
+        raise NotImplementedError
+
+    def readinto(self, buffer: memoryview) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def read_until(self, expected: bytes = b"\n") -> bytes:
+        data = bytearray()
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while not data.endswith(expected):
+            chunk = self.read(1)
+            if not chunk:
+                break
+            data += chunk
+            if deadline is not None and time.monotonic() > deadline:
+                break
+        return bytes(data)
+
+    def write(self, data: bytes) -> int:
+        raise NotImplementedError
+
+    def flushInput(self):
+        pass
+
+    def flushOutput(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class MemoryPipe:
+    def __init__(self) -> None:
+        self.buffer = bytearray()
+        self.closed = False
+        self._condition = threading.Condition()
+
+    def __len__(self) -> int:
+        return len(self.buffer)
+
+    def write(self, data: bytes):
+        with self._condition:
+            if self.closed:
+                raise BrokenPipeError("memory pipe is closed")
+            self.buffer += data
+            self._condition.notify_all()
+
+    def read(self, size: int, timeout: float = None) -> bytes:
+        with self._condition:
+            self._condition.wait_for(lambda: self.closed or len(self.buffer) >= size, timeout)
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+            return data
+
+    def readinto(self, buffer: memoryview, timeout: float = None) -> int:
+        size = len(buffer)
+        with self._condition:
+            self._condition.wait_for(lambda: self.closed or len(self.buffer) >= size, timeout)
+            size = min(size, len(self.buffer))
+            buffer[:size] = self.buffer[:size]
+            del self.buffer[:size]
+            return size
+
+    def read_until(self, expected: bytes, timeout: float = None) -> bytes:
+        with self._condition:
+            self._condition.wait_for(lambda: self.closed or self.buffer.find(expected) >= 0, timeout)
+            index = self.buffer.find(expected)
+            size = len(self.buffer) if index < 0 else index + len(expected)
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+            return data
+
+    def clear(self):
+        with self._condition:
+            self.buffer.clear()
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+
+class MemoryTransport(Transport):
+    def __init__(self, rx: MemoryPipe, tx: MemoryPipe, timeout: float = 2) -> None:
+        self.rx = rx
+        self.tx = tx
+        self.timeout = timeout
+
+    @classmethod
+    def pair(cls, timeout: float = 2) -> tuple["MemoryTransport", "MemoryTransport"]:
+        a, b = MemoryPipe(), MemoryPipe()
+        return cls(a, b, timeout), cls(b, a, timeout)
+
+    @property
+    def is_open(self) -> bool:
+        return not self.rx.closed
+
+    @property
+    def in_waiting(self) -> int:
+        return len(self.rx)
+
+    def read(self, size: int = 1) -> bytes:
+        return self.rx.read(size, self.timeout)
+
+    def readinto(self, buffer: memoryview) -> int:
+        return self.rx.readinto(buffer, self.timeout)
+
+    def read_until(self, expected: bytes = b"\n") -> bytes:
+        return self.rx.read_until(expected, self.timeout)
+
+    def write(self, data: bytes) -> int:
+        self.tx.write(data)
+        return len(data)
+
+    def flushInput(self):
+        self.rx.clear()
+
+    def close(self):
+        self.rx.close()
+        self.tx.close()
+
+
+class FdTransport(Transport):
+    def __init__(self, fd: int, timeout: float = 2) -> None:
+        self.fd = fd
+        self.timeout = timeout
+        self.hung_up = False
+        os.set_blocking(fd, False)
+
+    def fileno(self) -> int:
+        return self.fd
+
+    @property
+    def is_open(self) -> bool:
+        return not self.hung_up
+
+    @property
+    def in_waiting(self) -> int:
+        readable, _, _ = select.select([self.fd], [], [], 0)
+        return 1 if readable else 0
+
+    def read(self, size: int = 1) -> bytes:
+        data = bytearray()
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while len(data) < size:
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            readable, _, _ = select.select([self.fd], [], [], remaining)
+            if not readable:
+                break
+            try:
+                chunk = os.read(self.fd, size - len(data))
+            except BlockingIOError:
+                continue
+            except OSError:
+                # the other end of a pty hung up
+                self.hung_up = True
+                break
+            if not chunk:
+                self.hung_up = True
+                break
+            data += chunk
+        return bytes(data)
+
+    def readinto(self, buffer: memoryview) -> int:
+        buffer = memoryview(buffer)
+        size = 0
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while size < len(buffer):
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            readable, _, _ = select.select([self.fd], [], [], remaining)
+            if not readable:
+                break
+            try:
+                read = os.readv(self.fd, [buffer[size:]])
+            except BlockingIOError:
+                continue
+            except OSError:
+                self.hung_up = True
+                break
+            if not read:
+                self.hung_up = True
+                break
+            size += read
+        return size
+
+    def write(self, data: bytes) -> int:
+        view = memoryview(data)
+        while view:
+            select.select([], [self.fd], [])
+            try:
+                written = os.write(self.fd, view)
+            except BlockingIOError:
+                continue
+            view = view[written:]
+        return len(data)
+
+    def close(self):
+        self.hung_up = True
+        os.close(self.fd)
@@ -1,3 +1,23 @@
-from .icon import *
 from .proto_utils import *
 from .protocols import *
+
+# the icon pipeline imports Pillow and heatshrink2, so it is loaded on first attribute access
+_LAZY_ATTRS = {
+    **dict.fromkeys(("Icon", "png2xbm", "xbm2hs", "image2xbm", "xbm2icon", "icon2xbm", "image2icon", "file2icon"), ".icon"),
+    **dict.fromkeys(("IconCache", "default_icon_cache_dir", "ICON_CACHE_MAGIC", "ICON_CACHE_HEADER"), ".icon_cache"),
+}
+
+
+def __getattr__(name: str):
+    module = _LAZY_ATTRS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    from importlib import import_module
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(_LAZY_ATTRS))
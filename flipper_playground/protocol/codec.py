@@ -0,0 +1,61 @@
+import struct
+
+from .protocols import ProtoID
+
+
+# argument layout of each draw command, "s" marks a trailing length-prefixed utf-8 string
+DRAW_LAYOUTS: dict[ProtoID, str] = {
+    ProtoID.GUI_DRAW_STR_ID: "BBs",
+    ProtoID.GUI_DRAW_STR_ALIGN_ID: "BBBBs",
+    ProtoID.GUI_DRAW_FRAME_ID: "BBBB",
+    ProtoID.GUI_DRAW_RFRAME_ID: "BBBBB",
+    ProtoID.GUI_DRAW_ICON_ID: "BBB",
+    ProtoID.GUI_DRAW_DOT_ID: "BB",
+    ProtoID.GUI_DRAW_LINE_ID: "BBBB",
+    ProtoID.GUI_DRAW_CIRCLE_ID: "BBB",
+    ProtoID.GUI_DRAW_DISC_ID: "BBB",
+    ProtoID.GUI_DRAW_TRIANGLE_ID: "BBBBB",
+    ProtoID.GUI_DRAW_GLYPH_ID: "BBH",
+    ProtoID.GUI_DRAW_BOX_ID: "BBBB",
+    ProtoID.GUI_DRAW_RBOX_ID: "BBBBB",
+    ProtoID.GUI_SET_COLOR_ID: "B",
+    ProtoID.GUI_SET_COLOR_INVERTED_ID: "",
+    ProtoID.GUI_SET_FONT_ID: "B",
+    ProtoID.GUI_SET_FONT_DIRECTION_ID: "B",
+}
+
+
+class CommandCodec:
+    def __init__(self, proto_id: ProtoID, layout: str) -> None:
+        self.proto_id = int(proto_id)
+        self.layout = layout
+        self.has_str = layout.endswith("s")
+        args_layout = layout[:-1] if self.has_str else layout
+
+        # id + size header, the fixed arguments and, for string commands, the string length
+        self.struct = struct.Struct("<HI" + args_layout + ("I" if self.has_str else ""))
+        self.args_size = self.struct.size - 6
+
+    def append_to(self, buffer: bytearray, *args):
+        try:
+            if self.has_str:
+                data = args[-1].encode("utf-8")
+                buffer += self.struct.pack(self.proto_id, self.args_size + len(data), *args[:-1], len(data))
+                buffer += data
+            else:
+                buffer += self.struct.pack(self.proto_id, self.args_size, *args)
+        except struct.error as e:
+            raise ValueError(f"{ProtoID(self.proto_id).name}: {e}") from None
+
+    def unpack_from(self, buffer, offset: int = 0) -> tuple:
+        values = self.struct.unpack_from(buffer, offset)
+        if not self.has_str:
+            return values[2:]
+        data_start = offset + self.struct.size
+        data = bytes(buffer[data_start:data_start + values[-1]]).decode("utf-8")
+        return values[2:-1] + (data,)
+
+
+DRAW_CODECS: dict[ProtoID, CommandCodec] = {
+    proto_id: CommandCodec(proto_id, layout) for proto_id, layout in DRAW_LAYOUTS.items()
+}
@@ -0,0 +1,150 @@
+import struct
+
+
+PROTO_HEADER = struct.Struct("<HI")
+
+
+class RingBuffer:
+    def __init__(self, capacity: int = 4096) -> None:
+        self.buffer = bytearray(capacity)
+        self.head = 0
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def capacity(self) -> int:
+        return len(self.buffer)
+
+    def write(self, data: bytes | memoryview):
+        data_size = len(data)
+        if self.size + data_size > self.capacity:
+            self._grow(self.size + data_size)
+
+        tail = (self.head + self.size) % self.capacity
+        first = min(data_size, self.capacity - tail)
+        self.buffer[tail:tail + first] = data[:first]
+        self.buffer[:data_size - first] = data[first:]
+        self.size += data_size
+
+    def peek(self, size: int) -> bytes:
+        if size > self.size:
+            raise ValueError("peek: not enough data in buffer")
+
+        end = self.head + size
+        if end <= self.capacity:
+            return bytes(self.buffer[self.head:end])
+        return bytes(self.buffer[self.head:]) + bytes(self.buffer[:end - self.capacity])
+
+    def consume(self, size: int):
+        if size > self.size:
+            raise ValueError("consume: not enough data in buffer")
+
+        self.size -= size
+        self.head = 0 if self.size == 0 else (self.head + size) % self.capacity
+
+    def read(self, size: int) -> bytes:
+        data = self.peek(size)
+        self.consume(size)
+        return data
+
+    def clear(self):
+        self.head = 0
+        self.size = 0
+
+    def _grow(self, min_capacity: int):
+        capacity = self.capacity
+        while capacity < min_capacity:
+            capacity *= 2
+
+        data = self.peek(self.size)
+        self.buffer = bytearray(capacity)
+        self.buffer[:self.size] = data
+        self.head = 0
+
+
+class FrameBuffer:
+    # a linear receive buffer that is read into in place, frames are handed out as memoryview slices
+    # of it and stay valid until rewind(), which the event loop calls once a batch has been dispatched
+    def __init__(self, capacity: int = 4096) -> None:
+        self.capacity = capacity
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def needed(self) -> int:
+        # bytes still missing for the next complete frame
+        size = self.end - self.start
+        if size < PROTO_HEADER.size:
+            return PROTO_HEADER.size - size
+        _, data_size = PROTO_HEADER.unpack_from(self.buffer, self.start)
+        return max(0, PROTO_HEADER.size + data_size - size)
+
+    def has_frame(self) -> bool:
+        return self.end - self.start >= PROTO_HEADER.size and self.needed() == 0
+
+    def writable(self, size: int) -> memoryview:
+        if self.end + size > len(self.buffer):
+            # views handed out earlier keep the old buffer alive, so the unread tail moves to a new one
+            pending = self.view[self.start:self.end]
+            self.buffer = bytearray(max(self.capacity, len(pending) + size))
+            self.view = memoryview(self.buffer)
+            self.view[:len(pending)] = pending
+            self.start, self.end = 0, len(pending)
+        return self.view[self.end:self.end + size]
+
+    def commit(self, size: int):
+        self.end += size
+
+    def next_frame(self) -> tuple[int, memoryview]:
+        start = self.start
+        if self.end - start < PROTO_HEADER.size:
+            return None
+
+        id, data_size = PROTO_HEADER.unpack_from(self.buffer, start)
+        data_start = start + PROTO_HEADER.size
+        end = data_start + data_size
+        if end > self.end:
+            return None
+
+        self.start = end
+        return id, (self.view[data_start:end] if data_size else None)
+
+    def rewind(self):
+        size = self.end - self.start
+        if size:
+            self.buffer[:size] = self.buffer[self.start:self.end]
+        self.start, self.end = 0, size
+
+    def clear(self):
+        self.start = 0
+        self.end = 0
+
+
+class ProtoFramer:
+    def __init__(self, capacity: int = 4096) -> None:
+        self.buffer = RingBuffer(capacity)
+
+    def feed(self, data: bytes) -> list[tuple[int, bytes]]:
+        self.buffer.write(data)
+        return self.frames()
+
+    def frames(self) -> list[tuple[int, bytes]]:
+        frames = []
+        buffer = self.buffer
+        while len(buffer) >= PROTO_HEADER.size:
+            id, data_size = PROTO_HEADER.unpack(buffer.peek(PROTO_HEADER.size))
+            if len(buffer) < PROTO_HEADER.size + data_size:
+                break
+
+            buffer.consume(PROTO_HEADER.size)
+            frames.append((id, buffer.read(data_size) if data_size else None))
+        return frames
+
+    def reset(self):
+        self.buffer.clear()
@@ -3,6 +3,11 @@ import io
 import heatshrink2
 from PIL import Image, ImageOps
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 
 class Icon:
     def __init__(self, width: int, height: int, data: bytes):
@@ -23,25 +28,41 @@ def png2xbm(file_path) -> bytes:
             return output.getvalue()
 
 
-def xbm2hs(data) -> bytes:
-    return heatshrink2.compress(data, window_sz2=8, lookahead_sz2=4)
+def xbm2hs(data, window_sz2: int = 8, lookahead_sz2: int = 4) -> bytes:
+    return heatshrink2.compress(data, window_sz2=window_sz2, lookahead_sz2=lookahead_sz2)
+
 
+def image2xbm(image) -> tuple[int, int, bytes]:
+    # pack into xbm bit order: rows padded to whole bytes, least significant bit first,
+    # a set bit is a drawn (black) pixel
+    if isinstance(image, Image.Image):
+        bw = image.convert("1")
+        return bw.width, bw.height, bw.tobytes("raw", "1;IR")
 
-def file2icon(file_path) -> Icon:
-    output = png2xbm(file_path)
-    assert output
+    if np is not None and isinstance(image, np.ndarray):
+        if image.ndim != 2:
+            raise ValueError("image2xbm: array must be 2-dimensional")
+        packed = np.packbits(image.astype(bool, copy=False), axis=1, bitorder="little")
+        return image.shape[1], image.shape[0], packed.tobytes()
 
-    # Extract data from text
-    f = io.StringIO(output.decode().strip())
-    width = int(f.readline().strip().split(" ")[2])
-    height = int(f.readline().strip().split(" ")[2])
-    data = f.read().strip().replace("\n", "").replace(" ", "").split("=")[1][:-1]
-    data_str = data[1:-1].replace(",", " ").replace("0x", "")
+    rows = [list(row) for row in image]
+    width = len(rows[0]) if rows else 0
+    data = bytearray()
+    for row in rows:
+        if len(row) != width:
+            raise ValueError("image2xbm: all rows must have the same width")
+        for start in range(0, width, 8):
+            byte = 0
+            for bit, pixel in enumerate(row[start:start + 8]):
+                if pixel:
+                    byte |= 1 << bit
+            data.append(byte)
+    return width, len(rows), bytes(data)
 
-    data_bin = bytearray.fromhex(data_str)
 
+def xbm2icon(width: int, height: int, data_bin: bytes, window_sz2: int = 8, lookahead_sz2: int = 4) -> Icon:
     # Encode icon data with LZSS
-    data_encoded_str = xbm2hs(data_bin)
+    data_encoded_str = xbm2hs(data_bin, window_sz2, lookahead_sz2)
 
     assert data_encoded_str
 
@@ -55,3 +76,21 @@ def file2icon(file_path) -> Icon:
         data = b"\x00" + data_bin
 
     return Icon(width, height, data)
+
+
+def icon2xbm(data: bytes, window_sz2: int = 8, lookahead_sz2: int = 4) -> bytes:
+    # the inverse of xbm2icon: a raw marker byte, or a compressed marker and the compressed size
+    if data[0] == 0x00:
+        return bytes(data[1:])
+    size = data[2] | data[3] << 8
+    return heatshrink2.decompress(bytes(data[4:4 + size]), window_sz2=window_sz2, lookahead_sz2=lookahead_sz2)
+
+
+def image2icon(image, window_sz2: int = 8, lookahead_sz2: int = 4) -> Icon:
+    width, height, data_bin = image2xbm(image)
+    return xbm2icon(width, height, data_bin, window_sz2, lookahead_sz2)
+
+
+def file2icon(file_path, window_sz2: int = 8, lookahead_sz2: int = 4) -> Icon:
+    with Image.open(file_path) as im:
+        return image2icon(im, window_sz2, lookahead_sz2)
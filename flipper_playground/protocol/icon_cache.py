@@ -0,0 +1,140 @@
+import hashlib
+import io
+import os
+import struct
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from .icon import Icon, file2icon
+
+
+ICON_CACHE_MAGIC = b"FPIC\x01"
+ICON_CACHE_HEADER = struct.Struct("<BBI")
+
+
+def default_icon_cache_dir() -> Path:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "flipper_playground" / "icons"
+
+
+class IconCache:
+    def __init__(
+        self,
+        cache_dir: str = None,
+        persistent: bool = True,
+        max_entries: int = 128,
+        max_disk_bytes: int = 16 * 1024 * 1024,
+        window_sz2: int = 8,
+        lookahead_sz2: int = 4,
+    ) -> None:
+        self.cache_dir: Path = Path(cache_dir) if cache_dir else default_icon_cache_dir()
+        self.persistent = persistent
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.window_sz2 = window_sz2
+        self.lookahead_sz2 = lookahead_sz2
+        self._memory: OrderedDict[str, Icon] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, file_path) -> Icon:
+        with open(file_path, "rb") as f:
+            content = f.read()
+
+        key = self.key(content)
+        icon = self.lookup(key)
+        if icon is None:
+            icon = file2icon(io.BytesIO(content), self.window_sz2, self.lookahead_sz2)
+            self.put(key, icon)
+        return icon
+
+    def lookup(self, key: str) -> Icon:
+        with self._lock:
+            icon = self._memory.get(key)
+            if icon is not None:
+                self._memory.move_to_end(key)
+                return icon
+
+        icon = self._load(key)
+        if icon is not None:
+            self._remember(key, icon)
+        return icon
+
+    def put(self, key: str, icon: Icon):
+        self._store(key, icon)
+        self._remember(key, icon)
+
+    def key(self, content: bytes) -> str:
+        digest = hashlib.sha256(content)
+        digest.update(bytes([self.window_sz2, self.lookahead_sz2]))
+        return digest.hexdigest()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if not self.cache_dir.is_dir():
+            return
+        for path in self.cache_dir.glob("*.icon"):
+            path.unlink(missing_ok=True)
+
+    def _remember(self, key: str, icon: Icon):
+        with self._lock:
+            self._memory[key] = icon
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.icon"
+
+    def _load(self, key: str) -> Icon:
+        if not self.persistent:
+            return None
+
+        path = self._path(key)
+        try:
+            raw = path.read_bytes()
+            os.utime(path)
+        except OSError:
+            return None
+
+        if not raw.startswith(ICON_CACHE_MAGIC):
+            return None
+
+        width, height, data_size = ICON_CACHE_HEADER.unpack_from(raw, len(ICON_CACHE_MAGIC))
+        data = raw[len(ICON_CACHE_MAGIC) + ICON_CACHE_HEADER.size:]
+        if len(data) != data_size:
+            return None
+        return Icon(width, height, data)
+
+    def _store(self, key: str, icon: Icon):
+        if not self.persistent:
+            return
+
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_bytes(
+                ICON_CACHE_MAGIC + ICON_CACHE_HEADER.pack(icon.width, icon.height, len(icon.data)) + icon.data
+            )
+            os.replace(tmp_path, path)
+            self._evict()
+        except OSError:
+            # the disk cache is best effort, the icon is still served from memory
+            tmp_path.unlink(missing_ok=True)
+
+    def _evict(self):
+        entries = []
+        total_size = 0
+        for path in self.cache_dir.glob("*.icon"):
+            stat = path.stat()
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total_size += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self.max_disk_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total_size -= size
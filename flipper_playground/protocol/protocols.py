@@ -1,4 +1,10 @@
+import logging
 from enum import IntEnum
+from functools import partial
+from types import MappingProxyType
+
+
+logger = logging.getLogger("flipper_playground")
 
 
 class ProtoID(IntEnum):
@@ -60,43 +66,69 @@ class ProtoID(IntEnum):
 
 
 class DataHandler:
+    __slots__ = ()
+
+    # a zero copy handler is given a memoryview into the receive buffer instead of a bytes copy,
+    # the view is only valid during from_bytes, so decode it with struct.unpack_from and keep no reference
+    zero_copy: bool = False
+
     @classmethod
     def from_bytes(cls, data: bytes):
         raise NotImplementedError
 
 
-class ProtoInterface:
+class ProtoLogging:
+    logger: logging.Logger = logger
+
+    def set_log_level(self, level: int):
+        # a per instance child logger, so one device can be verbose without the others
+        self.logger = logger.getChild(f"{type(self).__name__}.{id(self):x}")
+        self.logger.setLevel(level)
+
+
+class ProtoInterface(ProtoLogging):
     def send(self, proto_id: ProtoID, data: bytes = b''):
         raise NotImplementedError
 
+    def write(self, payload: bytes):
+        raise NotImplementedError
+
     def add_data_handler(self, proto_id: ProtoID, handler: DataHandler):
         raise NotImplementedError
     
     def add_event_handler(self, proto_id: ProtoID, handler: callable):
         raise NotImplementedError
 
+    def add_batch_event_handler(self, proto_id: ProtoID, handler: callable, coalesce: callable = None):
+        raise NotImplementedError
+
 
-class ProtoParser:
+class ProtoParser(ProtoLogging):
     def __init__(self):
-        print("2")
         self.data_handlers: dict[ProtoID, DataHandler] = {}
+        self.zero_copy_ids: set[int] = set()
         super().__init__()
     
     def add_data_handler(self, proto_id: ProtoID, handler: DataHandler):
         self.data_handlers[proto_id] = handler
+        if getattr(handler, "zero_copy", False):
+            self.zero_copy_ids.add(int(proto_id))
+        else:
+            self.zero_copy_ids.discard(int(proto_id))
+        self.dispatch_table = None
 
     def parse_bytes(self, id: ProtoID, data: bytes):
         if id in self.data_handlers:
             return self.data_handlers[id].from_bytes(data)
         else:
-            print("Unknown proto id: " + str(id))
+            self.logger.warning("Unknown proto id: %s", id)
             return data
 
 
-class ProtoEventManager:
+class ProtoEventManager(ProtoLogging):
     def __init__(self):
-        print("1")
         self.event_handlers: dict[ProtoID, list[callable]] = {}
+        self.batch_event_handlers: dict[ProtoID, list[tuple[callable, callable]]] = {}
         super().__init__()
     
     def event_handler(self, proto_id: ProtoID):
@@ -109,12 +141,88 @@ class ProtoEventManager:
         if proto_id not in self.event_handlers:
             self.event_handlers[proto_id] = []
         self.event_handlers[proto_id].append(handler)
+        self.dispatch_table = None
+
+    def add_batch_event_handler(self, proto_id: ProtoID, handler: callable, coalesce: callable = None):
+        if proto_id not in self.batch_event_handlers:
+            self.batch_event_handlers[proto_id] = []
+        self.batch_event_handlers[proto_id].append((handler, coalesce))
+
+    def handle_events(self, events: list[tuple[ProtoID, object]]):
+        batches: dict[ProtoID, list] = {}
+        for id, data in events:
+            if id in self.event_handlers or id not in self.batch_event_handlers:
+                self.handle_event(id, data)
+            if id in self.batch_event_handlers:
+                batches.setdefault(id, []).append(data)
+
+        self.handle_batches(batches)
+
+    def handle_batches(self, batches: dict[ProtoID, list]):
+        # batch handlers get every event of their id at once, after the per event handlers ran
+        for id, batch in batches.items():
+            for handler, coalesce in self.batch_event_handlers[id]:
+                handler(coalesce(batch) if coalesce else batch)
 
     def handle_event(self, id: ProtoID, data: object=None):
-        print(f"Handling event: {id}")
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Handling event: %s", id)
         if id in self.event_handlers:
             for handler in self.event_handlers[id]:
                 if data is None: handler()
                 else: handler(data)
         else:
-            print("Unknown proto id: " + str(id))
+            self.logger.debug("No event handler for proto id: %s", id)
+
+
+def _dispatch_entry(decode: callable, handlers: tuple[callable, ...]) -> callable:
+    # one closure per proto id that decodes the payload and calls its handlers, specialised
+    # for the common single handler case
+    if len(handlers) == 1:
+        handler = handlers[0]
+
+        def entry(data: bytes):
+            if data is None:
+                handler()
+                return None
+            data = decode(data)
+            handler(data)
+            return data
+
+        return entry
+
+    def entry(data: bytes):
+        if data is None:
+            for handler in handlers:
+                handler()
+            return None
+        data = decode(data)
+        for handler in handlers:
+            handler(data)
+        return data
+
+    return entry
+
+
+class ProtoDispatcher(ProtoLogging):
+    def __init__(self):
+        self.dispatch_table: MappingProxyType = None
+        super().__init__()
+
+    def compile_dispatch_table(self) -> MappingProxyType:
+        table = {}
+        for id in set(self.data_handlers) | set(self.event_handlers):
+            data_handler = self.data_handlers.get(id)
+            if data_handler is None:
+                # parse_bytes passes the raw payload through with a warning
+                decode = partial(self.parse_bytes, id)
+            else:
+                decode = data_handler.from_bytes
+            table[int(id)] = _dispatch_entry(decode, tuple(self.event_handlers.get(id, ())))
+
+        self.dispatch_table = MappingProxyType(table)
+        return self.dispatch_table
+
+    def _dispatch_unknown(self, id: int, data: bytes) -> bytes:
+        self.logger.debug("No event handler for proto id: %s", id)
+        return data